@@ -1,13 +1,14 @@
+import math
 import os
 import uuid
 import json
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Blueprint, abort, current_app, make_response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import sys
 import threading
 import time
-from datetime import datetime
+from contextlib import contextmanager
 
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -15,210 +16,444 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 # Import your existing modules
 from src.extract import extract_text
 from src.structure_ai import structure_content
-from src.similarity_engine import compute_similarity
-from src.recommendations import generate_recommendations
-from src.styled_pdf_report import create_report
-from src.config import GEMINI_API_KEY
-
-app = Flask(__name__)
-CORS(app, origins=["http://localhost:3000"])
+from src.similarity_engine import classify_scores, get_embedding_backend, EMBEDDING_BACKENDS
+from src.gap_analysis import build_gaps, summarize_alignment
+from src import score_store
+from src.hierarchical_matcher import LEVELS
+from src.revision import revise_structure, update_scores
+from src.topic_dedup import dedup_structure, annotate_mapping
+from src import pipeline
+from src.response_cache import ResponseCache
+from src.task_store import TaskStore
+from src import artifact_store
+from src.artifact_store import RetentionManager
+from src.cancellation import CancellationToken, AnalysisCancelled, StageTimeout, run_in_process
+from src import standards_registry
+from src import mapping_store
+from src import config as env_config
+from src.config import (GEMINI_API_KEY, GEMINI_API_ENDPOINT, GEMINI_TRANSPORT, RESPONSE_CACHE_MAX_ENTRIES,
+                        EMBEDDING_BACKEND, HIERARCHICAL_MATCHING, LEXICAL_OVERLAP_THRESHOLD,
+                        FULL_ALIGNMENT_THRESHOLD, PARTIAL_MATCH_THRESHOLD,
+                        GAP_SEVERITY_HIGH_BELOW, GAP_SEVERITY_MEDIUM_BELOW, STANDARDS_FOLDER,
+                        UPLOAD_FOLDER, RESULTS_FOLDER, STATUS_FOLDER, CORS_ORIGINS, MAX_CONCURRENT_ANALYSES,
+                        TASK_HEARTBEAT_S, TASK_STALE_AFTER_S,
+                        STAGE_TIMEOUTS, RETENTION_ENABLED, RETENTION_TTL_DAYS, RETENTION_QUOTA_MB,
+                        RETENTION_INTERVAL_S, RETENTION_GRACE_S, RETENTION_MIGRATE_LEGACY, configure_gemini)
 
 # Configuration
-UPLOAD_FOLDER = 'data'
-RESULTS_FOLDER = 'results'
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
+MAPPING_PAGE_DEFAULT = 100
+MAPPING_PAGE_MAX = 1000
+
+api = Blueprint('api', __name__)
+
+def create_app(config=None):
+    """Application factory; `config` overrides the settings read from the environment.
+
+    Only the settings set in app.config below can be overridden per app; passing
+    another src.config setting raises ValueError instead of being ignored.
+    Everything a request needs lives in app.config, in files, or in per-process
+    caches that revalidate against files, so any number of worker processes can
+    serve the same data folders.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        GEMINI_API_KEY=GEMINI_API_KEY,
+        GEMINI_API_ENDPOINT=GEMINI_API_ENDPOINT,
+        GEMINI_TRANSPORT=GEMINI_TRANSPORT,
+        UPLOAD_FOLDER=UPLOAD_FOLDER,
+        RESULTS_FOLDER=RESULTS_FOLDER,
+        STANDARDS_FOLDER=STANDARDS_FOLDER,
+        STATUS_FOLDER=STATUS_FOLDER,
+        CORS_ORIGINS=CORS_ORIGINS,
+        RESPONSE_CACHE_MAX_ENTRIES=RESPONSE_CACHE_MAX_ENTRIES,
+        MAX_CONCURRENT_ANALYSES=MAX_CONCURRENT_ANALYSES,
+        TASK_HEARTBEAT_S=TASK_HEARTBEAT_S,
+        TASK_STALE_AFTER_S=TASK_STALE_AFTER_S,
+        STAGE_TIMEOUTS=dict(STAGE_TIMEOUTS),
+        RETENTION_ENABLED=RETENTION_ENABLED,
+        RETENTION_TTL_DAYS=RETENTION_TTL_DAYS,
+        RETENTION_QUOTA_MB=RETENTION_QUOTA_MB,
+        RETENTION_INTERVAL_S=RETENTION_INTERVAL_S,
+        RETENTION_GRACE_S=RETENTION_GRACE_S,
+        RETENTION_MIGRATE_LEGACY=RETENTION_MIGRATE_LEGACY,
+        EMBEDDING_BACKEND=EMBEDDING_BACKEND,
+        HIERARCHICAL_MATCHING=HIERARCHICAL_MATCHING,
+        LEXICAL_OVERLAP_THRESHOLD=LEXICAL_OVERLAP_THRESHOLD,
+        FULL_ALIGNMENT_THRESHOLD=FULL_ALIGNMENT_THRESHOLD,
+        PARTIAL_MATCH_THRESHOLD=PARTIAL_MATCH_THRESHOLD,
+        GAP_SEVERITY_HIGH_BELOW=GAP_SEVERITY_HIGH_BELOW,
+        GAP_SEVERITY_MEDIUM_BELOW=GAP_SEVERITY_MEDIUM_BELOW,
+        MAX_CONTENT_LENGTH=50 * 1024 * 1024  # 50MB
+    )
+    unsupported = sorted(k for k in (config or {}) if hasattr(env_config, k) and k not in app.config)
+    if unsupported:
+        raise ValueError(f"Only set through the environment, not per app: {', '.join(unsupported)}")
+    app.config.update(config or {})
+    if app.config['EMBEDDING_BACKEND'] not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{app.config['EMBEDDING_BACKEND']}'. "
+                         f"Choose one of: {', '.join(EMBEDDING_BACKENDS)}")
+    if not app.config['STATUS_FOLDER']:
+        app.config['STATUS_FOLDER'] = os.path.join(app.config['RESULTS_FOLDER'], 'status')
+
+    # The Gemini client is configured process-wide, so the last app created wins
+    configure_gemini(app.config['GEMINI_API_KEY'], app.config['GEMINI_API_ENDPOINT'], app.config['GEMINI_TRANSPORT'])
+
+    # Create folders if they don't exist
+    for folder in ('UPLOAD_FOLDER', 'RESULTS_FOLDER', 'STANDARDS_FOLDER', 'STATUS_FOLDER'):
+        os.makedirs(app.config[folder], exist_ok=True)
+
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+
+    # Task status is shared through files; the response cache is per process
+    app.extensions['task_store'] = TaskStore(app.config['STATUS_FOLDER'],
+                                             stale_after_seconds=app.config['TASK_STALE_AFTER_S'])
+    app.extensions['response_cache'] = ResponseCache(max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+    app.extensions['analysis_slots'] = threading.BoundedSemaphore(app.config['MAX_CONCURRENT_ANALYSES'])
+    app.extensions['retention'] = RetentionManager(
+        app.config['UPLOAD_FOLDER'],
+        app.config['RESULTS_FOLDER'],
+        app.extensions['task_store'],
+        ttl_seconds=app.config['RETENTION_TTL_DAYS'] * 86400,
+        quota_bytes=app.config['RETENTION_QUOTA_MB'] * 1024 * 1024,
+        interval_seconds=app.config['RETENTION_INTERVAL_S'],
+        grace_seconds=app.config['RETENTION_GRACE_S'],
+        migrate_legacy=app.config['RETENTION_MIGRATE_LEGACY']
+    )
+
+    app.register_blueprint(api)
+    return app
+
+def task_store():
+    return current_app.extensions['task_store']
+
+def results_path(session_id, suffix, create=False):
+    """Path of a session's result file, e.g. results_path(sid, "report.json")"""
+    return artifact_store.session_path(current_app.config['RESULTS_FOLDER'], session_id,
+                                       f"{session_id}_{suffix}", create)
+
+def upload_path(session_id, filename, create=False):
+    return artifact_store.session_path(current_app.config['UPLOAD_FOLDER'], session_id, filename, create)
+
+def touch_results(session_id):
+    artifact_store.touch_session(current_app.config['RESULTS_FOLDER'], session_id)
+
+@api.before_app_request
+def start_retention():
+    # Started lazily so each (forked) worker process runs its own compactor thread;
+    # the file lock lets only one of them compact at a time
+    if current_app.config['RETENTION_ENABLED']:
+        current_app.extensions['retention'].ensure_running()
+
+def invalid_session_id(session_id):
+    return not artifact_store.SESSION_ID_PATTERN.match(session_id or "")
+
+@api.url_value_preprocessor
+def reject_invalid_session_id(endpoint, values):
+    # Session ids become file names; reject anything else before it reaches the file system
+    if values and 'session_id' in values and invalid_session_id(values['session_id']):
+        abort(make_response(jsonify({"error": "Invalid session_id"}), 400))
+
+def start_background(target, *args, heartbeat=None):
+    """Run `target(*args)` in a daemon thread inside the current app's context;
+    with `heartbeat` (a session id) the task's heartbeat is refreshed while it runs"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            if heartbeat is None:
+                target(*args)
+                return
+            store = task_store()
+            stopped = threading.Event()
+            beat = threading.Thread(target=keep_beating, daemon=True,
+                                    args=(store, heartbeat, app.config['TASK_HEARTBEAT_S'], stopped))
+            beat.start()
+            try:
+                target(*args)
+            finally:
+                stopped.set()
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+def keep_beating(store, session_id, interval, stopped):
+    while not stopped.wait(interval):
+        try:
+            store.heartbeat(session_id)
+        except OSError as e:
+            print(f"⚠️ Heartbeat for {session_id} failed: {e}")
+
+def cancellation_token(session_id):
+    """Token that reports a cancel request made through any worker"""
+    store = task_store()
+    return CancellationToken(lambda: store.cancel_requested(session_id))
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['RESULTS_FOLDER'] = RESULTS_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
+def run_stage(token, name):
+    return token.stage(name, current_app.config['STAGE_TIMEOUTS'][name])
 
-# Create folders if they don't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(RESULTS_FOLDER, exist_ok=True)
+@contextmanager
+def analysis_slot(token):
+    """Hold one of this process's analysis slots; waiting for it can be cancelled"""
+    slots = current_app.extensions['analysis_slots']
+    while not slots.acquire(timeout=1):
+        token.check()
+    try:
+        yield
+    finally:
+        slots.release()
 
-# Store active tasks
-active_tasks = {}
+def record_task_failure(session_id, error, label):
+    """Store the terminal status of a task that did not complete"""
+    if isinstance(error, AnalysisCancelled):
+        print(f"[{session_id}] 🛑 {label} cancelled")
+        status = {"status": "cancelled", "message": f"{label} cancelled: {error}"}
+    elif isinstance(error, StageTimeout):
+        print(f"[{session_id}] ⏱️ {error}")
+        status = {"status": "timed_out", "stage": error.stage, "message": f"{label} timed out: {error}"}
+    else:
+        print(f"[{session_id}] ❌ Error: {str(error)}")
+        status = {"status": "failed", "message": f"{label} failed: {str(error)}"}
+    status["progress"] = 0
+    task_store().set(session_id, status)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_analysis_task(session_id, curriculum_path, standards_path):
-    """Background task to process analysis using your existing logic"""
-    try:
-        active_tasks[session_id] = {
-            "status": "processing",
-            "progress": 10,
-            "message": "Starting analysis..."
-        }
-        
-        print(f"[{session_id}] 📥 Extracting text...")
-        active_tasks[session_id]["progress"] = 20
-        active_tasks[session_id]["message"] = "Extracting text from documents..."
-        
-        curriculum_text = extract_text(curriculum_path)
-        standards_text = extract_text(standards_path)
+def cached_json_response(path, loader=None):
+    """Serve a JSON file from the response cache with ETag revalidation and compression"""
+    entry = current_app.extensions['response_cache'].get(path, loader)
 
-        print(f"[{session_id}] 🤖 Structuring content with Gemini...")
-        active_tasks[session_id]["progress"] = 40
-        active_tasks[session_id]["message"] = "Analyzing content structure..."
-        
-        # Create structured files
-        curriculum_json_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_curriculum.json")
-        standards_json_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_standards.json")
-        
-        structured_curriculum_raw = structure_content(curriculum_text, curriculum_json_path)
-        structured_curriculum = json.loads(structured_curriculum_raw)
+    # If-None-Match uses weak comparison, so ETags weakened by a proxy (W/"...") still match
+    matched = next((tag for tag in entry.variants() if request.if_none_match.contains_weak(tag)), None)
+    if matched:
+        response = current_app.response_class(status=304)
+        response.set_etag(matched)
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
 
-        structured_standards_raw = structure_content(standards_text, standards_json_path)
-        structured_standards = json.loads(structured_standards_raw)
+    body, encoding, etag = entry.select(lambda name: request.accept_encodings[name] > 0)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
-        print(f"[{session_id}] 📌 Running similarity & alignment...")
-        active_tasks[session_id]["progress"] = 60
-        active_tasks[session_id]["message"] = "Computing similarity mapping..."
-        
-        mapping = compute_similarity(structured_curriculum, structured_standards)
-        
-        mapping_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_mapping.json")
-        with open(mapping_path, "w") as f:
-            json.dump(mapping, f, indent=2)
+def analysis_settings():
+    """This app's matching settings for the shared pipeline"""
+    return {name: current_app.config[name] for name in pipeline.ANALYSIS_SETTINGS}
 
-        print(f"[{session_id}] 🧠 Generating recommendations...")
-        active_tasks[session_id]["progress"] = 80
-        active_tasks[session_id]["message"] = "Generating recommendations..."
-        
-        # Get the FULL detailed recommendations from Gemini
-        recommendations = generate_recommendations(mapping, structured_curriculum, structured_standards)
-
-        # Format gaps with proper structure
-        gaps_list = []
-        for i, item in enumerate(mapping):
-            if item["status"] == "Missing":
-                # Determine severity based on similarity
-                severity = "HIGH"
-                if "similarity" in item:
-                    if item["similarity"] < 0.3:
-                        severity = "HIGH"
-                    elif item["similarity"] < 0.6:
-                        severity = "MEDIUM"
-                    else:
-                        severity = "LOW"
-                
-                gaps_list.append({
-                    "id": i + 1,
-                    "topic": item["standard_topic"],
-                    "severity": severity,
-                    "description": f"Missing coverage of '{item['standard_topic']}' in curriculum",
-                    "recommendation": f"Add module on {item['standard_topic']} with appropriate learning outcomes"
-                })
-            elif item["status"] == "Partial match":
-                gaps_list.append({
-                    "id": i + 1,
-                    "topic": item["standard_topic"],
-                    "severity": "MEDIUM",
-                    "description": f"Partial coverage of '{item['standard_topic']}' (similarity: {item['similarity']:.2f})",
-                    "recommendation": f"Enhance existing content for {item['standard_topic']}"
-                })
-
-        # Calculate statistics
-        total_topics = len(mapping)
-        covered_topics = sum(1 for m in mapping if m['status'] != 'Missing')
-        coverage_percentage = (covered_topics / total_topics * 100) if total_topics > 0 else 0
-
-        # Create clean final report
-        final_report = {
-            "id": session_id,
-            "mapping_results": mapping,
-            "summary": {
-                "coverage": f"{coverage_percentage:.1f}%",
-                "topicsCovered": covered_topics,
-                "totalTopics": total_topics,
-                "gaps": len(gaps_list),
-                "recommendations": 15,  # Standard number for frontend display
-                "alignmentScore": round(coverage_percentage)
-            },
-            "gaps": gaps_list,
-            "recommendations": recommendations,  # Send FULL detailed recommendations as string
-            "strengths": [
-                "Strong foundation in programming fundamentals",
-                "Good balance of theory and practice",
-                "Regular assessment and feedback mechanisms",
-                "Structured learning progression"
-            ],
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Save JSON report
-        json_report_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_report.json")
-        with open(json_report_path, "w", encoding='utf-8') as f:
-            json.dump(final_report, f, indent=2, ensure_ascii=False)
-        
-        # Generate PDF report
-        pdf_report_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_report.pdf")
-        create_report(json_report_path, pdf_report_path)
+def analysis_hooks(session_id, token):
+    """Artifact paths, stage wrapper, progress reporting and settings of a session for the shared pipeline"""
+    store = task_store()
+    return {
+        "out": lambda suffix: results_path(session_id, suffix, create=True),
+        "stage": lambda name: run_stage(token, name),
+        "progress": lambda percent, message: store.update(session_id, progress=percent, message=message),
+        "settings": analysis_settings(),
+    }
+
+def process_analysis_task(session_id, curriculum_path, standards_path, standards_id=None):
+    """Background task to process analysis using your existing logic"""
+    token = cancellation_token(session_id)
+    try:
+        with analysis_slot(token):
+            task_store().set(session_id, {
+                "status": "processing",
+                "progress": 10,
+                "message": "Starting analysis..."
+            })
+
+            standards = None
+            if standards_id:
+                standards_folder = current_app.config['STANDARDS_FOLDER']
+                standards = (standards_registry.load_structure(standards_id, standards_folder),
+                             *standards_registry.load_embeddings(standards_id, current_app.config['EMBEDDING_BACKEND'],
+                                                                 root=standards_folder))
 
-        active_tasks[session_id] = {
+            report_paths, _ = pipeline.run_analysis(
+                session_id, curriculum_path, token=token, standards_path=standards_path, standards=standards,
+                **analysis_hooks(session_id, token)
+            )
+
+        task_store().set(session_id, {
             "status": "completed",
             "progress": 100,
             "message": "Analysis completed successfully",
             "report_id": session_id,
-            "report_paths": {
-                "json": json_report_path,
-                "pdf": pdf_report_path,
-                "mapping": mapping_path
-            }
-        }
+            "report_paths": report_paths
+        })
         
         print(f"[{session_id}] ✅ Analysis completed!")
         
     except Exception as e:
-        print(f"[{session_id}] ❌ Error: {str(e)}")
-        active_tasks[session_id] = {
-            "status": "failed",
-            "progress": 0,
-            "message": f"Analysis failed: {str(e)}"
-        }
+        record_task_failure(session_id, e, "Analysis")
+    finally:
+        task_store().clear_cancel(session_id)
+
+def revise_analysis_task(session_id, curriculum_path, previous_upload=None):
+    """Background task to re-analyse a revised curriculum, recomputing only what changed
+
+    The previous version's text is the one stored by the last analysis, or is
+    extracted from `previous_upload` for sessions analysed before it was stored.
+    """
+    token = cancellation_token(session_id)
+    try:
+        with analysis_slot(token):
+            task_store().set(session_id, {
+                "status": "processing",
+                "progress": 10,
+                "message": "Starting revision analysis..."
+            })
+
+            print(f"[{session_id}] 📥 Extracting revised text...")
+            task_store().update(session_id, progress=20, message="Extracting text from revised curriculum...")
+
+            with run_stage(token, "extraction"):
+                curriculum_text = run_in_process(token, extract_text, curriculum_path)
+                if previous_upload:
+                    previous_text = run_in_process(token, extract_text, previous_upload)
+                else:
+                    with open(results_path(session_id, "curriculum.txt"), 'r', encoding='utf-8') as f:
+                        previous_text = f.read()
+
+            curriculum_json_path = results_path(session_id, "curriculum.json", create=True)
+            standards_json_path = results_path(session_id, "standards.json", create=True)
+            with open(curriculum_json_path, 'r', encoding='utf-8') as f:
+                previous_curriculum = json.load(f)
+            with open(standards_json_path, 'r', encoding='utf-8') as f:
+                structured_standards = json.load(f)
+
+            print(f"[{session_id}] 🤖 Re-structuring changed sections...")
+            task_store().update(session_id, progress=40, message="Analyzing changed sections...")
+
+            delta_path = results_path(session_id, "curriculum_delta.json", create=True)
+            with run_stage(token, "structuring"):
+                structured_curriculum, section_diff = revise_structure(
+                    previous_curriculum, previous_text, curriculum_text,
+                    lambda text: structure_content(text, delta_path, check=token.check)
+                )
+            print(f"[{session_id}] 🧩 Sections: {section_diff}")
+
+            with open(curriculum_json_path, "w", encoding='utf-8') as f:
+                json.dump(structured_curriculum, f, ensure_ascii=False)
+
+            print(f"[{session_id}] 📌 Updating similarity for changed topics...")
+            task_store().update(session_id, progress=60, message="Updating similarity mapping...")
+
+            with run_stage(token, "similarity"):
+                curriculum_for_matching, curriculum_groups = dedup_structure(structured_curriculum)
+                standards_for_matching, standards_groups = dedup_structure(structured_standards)
+
+                scores_base = results_path(session_id, "scores", create=True)
+                old_scores, labels = score_store.load_score_matrix(scores_base)
+                if labels["standard_topics"] != standards_for_matching["topics"]:
+                    raise ValueError("Stored score matrix does not match this session's standards")
+
+                scores, similarity_stats, score_updates = update_scores(
+                    old_scores, labels, standards_for_matching["topics"], curriculum_for_matching["topics"],
+                    get_embedding_backend(current_app.config['EMBEDDING_BACKEND']), check=token.check,
+                    standard_vectors=score_store.load_standard_vectors(scores_base),
+                    lexical_threshold=current_app.config['LEXICAL_OVERLAP_THRESHOLD']
+                )
+            print(f"[{session_id}] 📊 Score updates: {score_updates}")
+
+            report_paths, _ = pipeline.finalize_analysis(
+                session_id, token=token, structured_curriculum=structured_curriculum,
+                structured_standards=structured_standards,
+                curriculum_for_matching=curriculum_for_matching, standards_for_matching=standards_for_matching,
+                curriculum_groups=curriculum_groups, standards_groups=standards_groups,
+                scores=scores, similarity_stats=similarity_stats,
+                extra_report={"revision": {"sections": section_diff, "scores": score_updates}},
+                **analysis_hooks(session_id, token)
+            )
+
+            with open(results_path(session_id, "curriculum.txt", create=True), "w", encoding='utf-8') as f:
+                f.write(curriculum_text)
+
+        task_store().set(session_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Revision analysis completed successfully",
+            "report_id": session_id,
+            "report_paths": report_paths
+        })
+
+        print(f"[{session_id}] ✅ Revision analysis completed!")
+
+    except Exception as e:
+        record_task_failure(session_id, e, "Revision analysis")
+    finally:
+        task_store().clear_cancel(session_id)
 
-@app.route('/api/health', methods=['GET'])
+def register_standards_task(standards_id, standards_path):
+    """Background task to structure and embed a standards document for the registry"""
+    try:
+        print(f"[{standards_id}] 📚 Registering standards...")
+        token = CancellationToken()
+        with run_stage(token, "extraction"):
+            standards_text = run_in_process(token, extract_text, standards_path)
+        standards_registry.ingest_standards(
+            standards_id,
+            standards_text,
+            structure_content,
+            get_embedding_backend(current_app.config['EMBEDDING_BACKEND']),
+            root=current_app.config['STANDARDS_FOLDER']
+        )
+        print(f"[{standards_id}] ✅ Standards registered!")
+    except Exception as e:
+        print(f"[{standards_id}] ❌ Error: {str(e)}")
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "service": "Curriculum Gap Identifier AI",
-        "gemini_configured": bool(GEMINI_API_KEY)
+        "gemini_configured": bool(current_app.config['GEMINI_API_KEY'])
     })
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
 def upload_files():
     """Handle file uploads"""
     try:
-        if 'curriculum' not in request.files or 'standards' not in request.files:
-            return jsonify({"error": "Both curriculum and standards files are required"}), 400
+        standards_id = request.form.get('standards_id')
+        if 'curriculum' not in request.files or ('standards' not in request.files and not standards_id):
+            return jsonify({"error": "A curriculum file and either a standards file or a standards_id are required"}), 400
         
         curriculum_file = request.files['curriculum']
-        standards_file = request.files['standards']
+        standards_file = request.files.get('standards') if not standards_id else None
         
-        if curriculum_file.filename == '' or standards_file.filename == '':
+        if curriculum_file.filename == '' or (standards_file and standards_file.filename == ''):
             return jsonify({"error": "No selected file"}), 400
         
-        if not (allowed_file(curriculum_file.filename) and allowed_file(standards_file.filename)):
+        if not (allowed_file(curriculum_file.filename) and (standards_id or allowed_file(standards_file.filename))):
             return jsonify({"error": f"Allowed file types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+
+        if standards_id and not standards_registry.is_ready(standards_id, current_app.config['STANDARDS_FOLDER']):
+            return jsonify({"error": "Registered standards not found or not ready"}), 404
         
         # Generate session ID
         session_id = str(uuid.uuid4())[:8]
         
         # Save files with session ID
-        curriculum_filename = f"curriculum_{session_id}.pdf"
-        standards_filename = f"standards_{session_id}.pdf"
-        
-        curriculum_path = os.path.join(app.config['UPLOAD_FOLDER'], curriculum_filename)
-        standards_path = os.path.join(app.config['UPLOAD_FOLDER'], standards_filename)
-        
+        curriculum_filename = f"curriculum_{session_id}.{curriculum_file.filename.rsplit('.', 1)[1].lower()}"
+        curriculum_path = upload_path(session_id, curriculum_filename, create=True)
         curriculum_file.save(curriculum_path)
-        standards_file.save(standards_path)
+
+        standards_filename = None
+        if standards_file:
+            standards_filename = f"standards_{session_id}.{standards_file.filename.rsplit('.', 1)[1].lower()}"
+            standards_path = upload_path(session_id, standards_filename, create=True)
+            standards_file.save(standards_path)
         
         return jsonify({
             "message": "Files uploaded successfully",
             "session_id": session_id,
+            "standards_id": standards_id,
             "files": {
                 "curriculum": curriculum_filename,
                 "standards": standards_filename
@@ -228,7 +463,7 @@ def upload_files():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/process', methods=['POST'])
+@api.route('/api/process', methods=['POST'])
 def process_analysis():
     """Start analysis process"""
     try:
@@ -236,24 +471,38 @@ def process_analysis():
         session_id = data.get('session_id')
         curriculum_file = data.get('curriculum')
         standards_file = data.get('standards')
+        standards_id = data.get('standards_id')
         
-        if not all([session_id, curriculum_file, standards_file]):
+        if not all([session_id, curriculum_file, standards_file or standards_id]):
             return jsonify({"error": "Missing required parameters"}), 400
+        if invalid_session_id(session_id):
+            return jsonify({"error": "Invalid session_id"}), 400
         
         # Check if files exist
-        curriculum_path = os.path.join(app.config['UPLOAD_FOLDER'], curriculum_file)
-        standards_path = os.path.join(app.config['UPLOAD_FOLDER'], standards_file)
-        
-        if not os.path.exists(curriculum_path) or not os.path.exists(standards_path):
+        curriculum_path = upload_path(session_id, os.path.basename(curriculum_file))
+        standards_path = None
+        
+        if standards_id:
+            if not standards_registry.is_ready(standards_id, current_app.config['STANDARDS_FOLDER']):
+                return jsonify({"error": "Registered standards not found or not ready"}), 404
+        else:
+            standards_path = upload_path(session_id, os.path.basename(standards_file))
+            if not os.path.exists(standards_path):
+                return jsonify({"error": "Uploaded files not found"}), 404
+        
+        if not os.path.exists(curriculum_path):
             return jsonify({"error": "Uploaded files not found"}), 404
         
         # Start processing in background thread
-        thread = threading.Thread(
-            target=process_analysis_task,
-            args=(session_id, curriculum_path, standards_path)
-        )
-        thread.daemon = True
-        thread.start()
+        # Recorded before the thread starts so any worker can answer a status poll right away
+        task_store().clear_cancel(session_id)
+        task_store().set(session_id, {
+            "status": "processing",
+            "progress": 0,
+            "message": "Queued for analysis..."
+        })
+        start_background(process_analysis_task, session_id, curriculum_path, standards_path, standards_id,
+                         heartbeat=session_id)
         
         return jsonify({
             "message": "Analysis started",
@@ -265,39 +514,171 @@ def process_analysis():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/status/<session_id>', methods=['GET'])
+@api.route('/api/process/<session_id>/revise', methods=['POST'])
+def revise_analysis(session_id):
+    """Re-analyse a revised curriculum for an existing session"""
+    try:
+        if 'curriculum' not in request.files:
+            return jsonify({"error": "A revised curriculum file is required"}), 400
+
+        curriculum_file = request.files['curriculum']
+        if curriculum_file.filename == '' or not allowed_file(curriculum_file.filename):
+            return jsonify({"error": f"Allowed file types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+
+        if task_store().is_processing(session_id):
+            return jsonify({"error": "Session is still being processed"}), 409
+
+        required = ["curriculum.json", "standards.json", "scores.npy"]
+        if not all(os.path.exists(results_path(session_id, suffix)) for suffix in required):
+            return jsonify({"error": "No completed analysis found for this session"}), 404
+
+        # Sessions analysed before the text was stored re-extract the original upload
+        previous_upload = None
+        if not os.path.exists(results_path(session_id, "curriculum.txt")):
+            candidates = [upload_path(session_id, f"curriculum_{session_id}.{ext}") for ext in sorted(ALLOWED_EXTENSIONS)]
+            previous_upload = next((path for path in candidates if os.path.exists(path)), None)
+            if previous_upload is None:
+                return jsonify({"error": "Previous curriculum version not found for this session"}), 404
+
+        extension = curriculum_file.filename.rsplit('.', 1)[1].lower()
+        curriculum_filename = f"curriculum_{session_id}_rev{int(time.time())}.{extension}"
+        curriculum_path = upload_path(session_id, curriculum_filename, create=True)
+        curriculum_file.save(curriculum_path)
+
+        task_store().clear_cancel(session_id)
+        task_store().set(session_id, {
+            "status": "processing",
+            "progress": 0,
+            "message": "Queued for revision analysis..."
+        })
+        start_background(revise_analysis_task, session_id, curriculum_path, previous_upload,
+                         heartbeat=session_id)
+
+        return jsonify({
+            "message": "Revision analysis started",
+            "session_id": session_id,
+            "status": "processing",
+            "curriculum": curriculum_filename
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/standards', methods=['POST'])
+def register_standards():
+    """Register a standards document once so analyses can reuse its structure and embeddings"""
+    try:
+        if 'standards' not in request.files:
+            return jsonify({"error": "A standards file is required"}), 400
+
+        standards_file = request.files['standards']
+        if standards_file.filename == '' or not allowed_file(standards_file.filename):
+            return jsonify({"error": f"Allowed file types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+
+        filename = secure_filename(standards_file.filename)
+        standards_id = standards_registry.create_entry(
+            request.form.get('name'), filename, root=current_app.config['STANDARDS_FOLDER']
+        )
+        standards_path = os.path.join(
+            standards_registry.standards_dir(standards_id, current_app.config['STANDARDS_FOLDER']), filename
+        )
+        standards_file.save(standards_path)
+
+        start_background(register_standards_task, standards_id, standards_path)
+
+        return jsonify({
+            "message": "Standards registration started",
+            "standards_id": standards_id,
+            "status": "processing"
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/standards', methods=['GET'])
+def list_registered_standards():
+    """List registered standards documents"""
+    return jsonify(standards_registry.list_standards(current_app.config['STANDARDS_FOLDER']))
+
+@api.route('/api/standards/<standards_id>', methods=['GET'])
+def get_registered_standards(standards_id):
+    """Get a registered standards document's status and metadata"""
+    try:
+        meta = standards_registry.get_meta(standards_id, current_app.config['STANDARDS_FOLDER'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not meta:
+        return jsonify({"error": "Standards not found"}), 404
+    return jsonify(meta)
+
+@api.route('/api/process/<session_id>/cancel', methods=['POST'])
+def cancel_analysis(session_id):
+    """Ask a running analysis to stop; it ends with status "cancelled" once it notices"""
+    status = task_store().get(session_id)
+    if status is None:
+        return jsonify({"error": "Session not found"}), 404
+    if status.get("status") != "processing":
+        return jsonify({"error": f"Analysis is not running (status: {status.get('status')})"}), 409
+
+    task_store().request_cancel(session_id)
+    return jsonify({
+        "message": "Cancellation requested",
+        "session_id": session_id,
+        "status": "cancelling"
+    }), 202
+
+@api.route('/api/status/<session_id>', methods=['GET'])
 def get_status(session_id):
     """Check analysis status"""
-    if session_id not in active_tasks:
+    status = task_store().get(session_id)
+    if status is None:
         return jsonify({"error": "Session not found"}), 404
-    
-    return jsonify(active_tasks[session_id])
 
-@app.route('/api/reports/<session_id>', methods=['GET'])
+    status.pop("owner", None)
+    if status.get("status") == "processing" and task_store().cancel_requested(session_id):
+        status["cancel_requested"] = True
+    return jsonify(status)
+
+@api.route('/api/storage/usage', methods=['GET'])
+def storage_usage():
+    """Disk usage and evictions from the last retention pass (?refresh=1 runs a pass now)"""
+    try:
+        retention = current_app.extensions['retention']
+        stats = retention.compact() if request.args.get('refresh') in ('1', 'true') else None
+        return jsonify({
+            "enabled": current_app.config['RETENTION_ENABLED'],
+            "ttl_days": current_app.config['RETENTION_TTL_DAYS'],
+            "quota_mb": current_app.config['RETENTION_QUOTA_MB'],
+            "last_pass": stats or retention.last_stats()
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/reports/<session_id>', methods=['GET'])
 def get_report(session_id):
     """Get report data"""
     try:
-        report_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_report.json")
+        report_path = results_path(session_id, "report.json")
         
         if not os.path.exists(report_path):
             return jsonify({"error": "Report not found"}), 404
+        touch_results(session_id)
         
-        with open(report_path, 'r', encoding='utf-8') as f:
-            report_data = json.load(f)
-        
-        return jsonify(report_data)
+        return cached_json_response(report_path)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reports/<session_id>/pdf', methods=['GET'])
+@api.route('/api/reports/<session_id>/pdf', methods=['GET'])
 def download_pdf(session_id):
     """Download PDF report"""
     try:
-        pdf_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_report.pdf")
+        pdf_path = results_path(session_id, "report.pdf")
         
         if not os.path.exists(pdf_path):
             return jsonify({"error": "PDF report not found"}), 404
+        touch_results(session_id)
         
         return send_file(
             pdf_path,
@@ -309,14 +690,15 @@ def download_pdf(session_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reports/<session_id>/json', methods=['GET'])
+@api.route('/api/reports/<session_id>/json', methods=['GET'])
 def download_json(session_id):
     """Download JSON report"""
     try:
-        json_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_report.json")
+        json_path = results_path(session_id, "report.json")
         
         if not os.path.exists(json_path):
             return jsonify({"error": "JSON report not found"}), 404
+        touch_results(session_id)
         
         return send_file(
             json_path,
@@ -328,27 +710,145 @@ def download_json(session_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/results/<session_id>/mapping', methods=['GET'])
+def query_number(args, name, default=None, kind=float):
+    """Query parameter `name` as a number, or `default` when absent; ValueError names the bad parameter"""
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number):
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    return number
+
+def parse_mapping_query(args):
+    """Parse offset/limit/status/similarity filters; returns None when no paging is requested"""
+    keys = ('offset', 'limit', 'status', 'min_similarity', 'max_similarity')
+    if not any(key in args for key in keys):
+        return None
+
+    statuses = args.getlist('status')
+    unknown = [s for s in statuses if s not in mapping_store.STATUSES]
+    if unknown:
+        raise ValueError(f"Unknown status: {', '.join(unknown)}")
+
+    offset = query_number(args, 'offset', 0, kind=int)
+    limit = query_number(args, 'limit', MAPPING_PAGE_DEFAULT, kind=int)
+    if offset < 0 or not 0 < limit <= MAPPING_PAGE_MAX:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {MAPPING_PAGE_MAX}")
+
+    min_similarity = query_number(args, 'min_similarity')
+    max_similarity = query_number(args, 'max_similarity')
+    return {
+        "offset": offset,
+        "limit": limit,
+        "statuses": statuses,
+        "min_similarity": min_similarity,
+        "max_similarity": max_similarity,
+    }
+
+def filter_legacy_mapping(mapping, offset, limit, statuses, min_similarity, max_similarity):
+    """Apply mapping filters in memory for sessions stored as a single JSON array"""
+    rows = [
+        m for m in mapping
+        if (not statuses or m.get('status') in statuses)
+        and (min_similarity is None or m.get('similarity', 0) >= min_similarity)
+        and (max_similarity is None or m.get('similarity', 0) <= max_similarity)
+    ]
+    return len(rows), rows[offset:offset + limit]
+
+@api.route('/api/results/<session_id>/mapping', methods=['GET'])
 def get_mapping(session_id):
-    """Get mapping data"""
+    """Get mapping data for a level, optionally paginated and filtered by status or similarity"""
     try:
-        mapping_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}_mapping.json")
-        
-        if not os.path.exists(mapping_path):
+        try:
+            query = parse_mapping_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        mapping_base = results_path(session_id, "mapping")
+
+        level = request.args.get('level', 'topics')
+        if level != 'topics':
+            if level not in LEVELS:
+                return jsonify({"error": f"level must be one of: topics, {', '.join(LEVELS)}"}), 400
+            mapping_base = f"{mapping_base}_{level}"
+
+        legacy_path = f"{mapping_base}.json"
+        stored = mapping_store.mapping_exists(mapping_base)
+
+        if not stored and not os.path.exists(legacy_path):
             return jsonify({"error": "Mapping data not found"}), 404
-        
-        with open(mapping_path, 'r') as f:
-            mapping_data = json.load(f)
-        
-        return jsonify(mapping_data)
-        
+        touch_results(session_id)
+
+        if stored:
+            if query is None:
+                return cached_json_response(
+                    mapping_store.records_path(mapping_base),
+                    loader=lambda path: mapping_store.read_mapping(mapping_base)
+                )
+            total, items = mapping_store.query_mapping(mapping_base, **query)
+        else:
+            if query is None:
+                return cached_json_response(legacy_path)
+            with open(legacy_path, 'r') as f:
+                total, items = filter_legacy_mapping(json.load(f), **query)
+
+        return jsonify({
+            "total": total,
+            "offset": query["offset"],
+            "limit": query["limit"],
+            "items": items
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/results/<session_id>/reclassify', methods=['GET'])
+def reclassify_results(session_id):
+    """Re-derive statuses, gaps and coverage for new thresholds from the stored score matrix"""
+    try:
+        scores_base = results_path(session_id, "scores")
+        if not score_store.score_matrix_exists(scores_base):
+            return jsonify({"error": "Score matrix not found for this session"}), 404
+        touch_results(session_id)
+
+        try:
+            full = query_number(request.args, 'full', current_app.config['FULL_ALIGNMENT_THRESHOLD'])
+            partial = query_number(request.args, 'partial', current_app.config['PARTIAL_MATCH_THRESHOLD'])
+            high = query_number(request.args, 'high', current_app.config['GAP_SEVERITY_HIGH_BELOW'])
+            medium = query_number(request.args, 'medium', current_app.config['GAP_SEVERITY_MEDIUM_BELOW'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not (partial <= full and high <= medium):
+            return jsonify({"error": "Thresholds must satisfy partial <= full and high <= medium"}), 400
+
+        scores, labels = score_store.load_score_matrix(scores_base)
+        mapping = classify_scores(scores, labels["standard_topics"], labels["curriculum_topics"], full, partial,
+                                  tiers=labels.get("tiers"),
+                                  default_thresholds=(current_app.config['FULL_ALIGNMENT_THRESHOLD'],
+                                                      current_app.config['PARTIAL_MATCH_THRESHOLD']))
+        annotate_mapping(mapping, labels.get("standard_groups", {}), labels.get("curriculum_groups", {}))
+        gaps_list = build_gaps(mapping, high, medium)
+
+        return jsonify({
+            "id": session_id,
+            "thresholds": {"full": full, "partial": partial, "high": high, "medium": medium},
+            "mapping_results": mapping,
+            "summary": summarize_alignment(mapping, gaps_list),
+            "gaps": gaps_list
+        })
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    app = create_app()
     print("🚀 Starting Curriculum Gap Identifier API...")
     print(f"📁 Upload folder: {app.config['UPLOAD_FOLDER']}")
     print(f"📁 Results folder: {app.config['RESULTS_FOLDER']}")
-    print(f"🔑 Gemini API: {'✅ Configured' if GEMINI_API_KEY else '❌ Not configured'}")
+    print("🔑 Gemini API: ✅ Configured")
     print("🌐 Server running on http://localhost:5000")
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes'), port=5000)
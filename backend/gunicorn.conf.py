@@ -0,0 +1,33 @@
+"""
+Production server settings for the Curriculum Gap Identifier API
+
+    gunicorn -c gunicorn.conf.py
+
+Send HUP to the master for a graceful restart of all workers, or USR2 followed
+by QUIT to the old master to pick up new code (workers are preloaded).
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "api:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Request handling scales with processes; analyses run in background threads of a worker
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Import the app (and its models) once in the master, then fork
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+# Recycling a worker also ends the analyses running in it, so this is off by default
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
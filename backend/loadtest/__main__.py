@@ -0,0 +1,3 @@
+from .run_load import main
+
+main()
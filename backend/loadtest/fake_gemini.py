@@ -0,0 +1,195 @@
+"""
+Local stand-in for the Gemini REST API used by the backend.
+
+Serves generateContent, streamGenerateContent, embedContent and
+batchEmbedContents with configurable latency and error rates, so the whole
+analysis pipeline can be driven without network access or quota.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+ROUTE_PATTERN = re.compile(r"^/v1beta/models/([^/:]+):(\w+)$")
+
+# Word runs in the source document that look like topic titles
+TITLE_PATTERN = re.compile(r"^[A-Z][A-Za-z0-9 ,&()/-]{3,60}$")
+
+
+def _embedding(text):
+    """Deterministic unit vector per text, so identical topics score 1.0."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def _content_text(content):
+    return "\n".join(part.get("text", "") for part in content.get("parts", []))
+
+
+def _prompt_text(body):
+    return "\n".join(_content_text(content) for content in body.get("contents", []))
+
+
+def _structure_reply(prompt):
+    """A structuring answer built from title-like lines of the document in the prompt."""
+    fields = json.loads(re.search(r"JSON Format:\s*(\{[\s\S]*?\n\s*\})", prompt).group(1))
+    document = prompt.split("Extract based on the following content:", 1)[-1]
+    titles = list(dict.fromkeys(
+        line.strip() for line in document.splitlines() if TITLE_PATTERN.match(line.strip())
+    ))
+    reply = {}
+    for i, field in enumerate(fields):
+        if field == "subject":
+            reply[field] = titles[0] if titles else "Subject"
+        else:
+            reply[field] = titles[i::len(fields)][:25] or [f"{field} item"]
+    return json.dumps(reply)
+
+
+def _gap_reply(prompt):
+    gaps = json.loads(re.search(r"GAPS \(JSON, one object per standard topic\):\s*(\[[\s\S]*?\n\s*\])", prompt).group(1))
+    start = int(re.search(r"numbering entries from (\d+)", prompt).group(1))
+    return "\n\n".join(
+        f"{start + i}. **Topic: {gap['standard_topic']}**\n   - Status: {gap['status']}\n"
+        f"   - Bloom's Taxonomy Gaps:\n     * Apply: practice exercises"
+        for i, gap in enumerate(gaps)
+    )
+
+
+def _synthesis_reply(prompt):
+    headings = re.findall(r"^\s*### (.+)$", prompt, re.MULTILINE)
+    return "\n\n".join(f"### {heading.strip()}\n\nPlaceholder text." for heading in headings)
+
+
+def generate_reply(prompt):
+    if "JSON Format:" in prompt:
+        return _structure_reply(prompt)
+    if "GAPS (JSON" in prompt:
+        return _gap_reply(prompt)
+    return _synthesis_reply(prompt)
+
+
+def _candidate(text, finish=True):
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+class FakeGemini:
+    """Threaded HTTP server answering like the Gemini REST API.
+
+    Every request waits `latency` seconds (plus up to `jitter`) and then fails
+    with HTTP 503 with probability `error_rate`. Call counts per method are kept
+    in `stats`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 stream_chunk_chars=200, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self.random = random.Random(seed)
+        self.stats = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, method, failed):
+        with self._lock:
+            entry = self.stats.setdefault(method, {"calls": 0, "errors": 0})
+            entry["calls"] += 1
+            entry["errors"] += int(failed)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                route = ROUTE_PATTERN.match(self.path.split("?", 1)[0])
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not route:
+                    return self._send(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+
+                method = route.group(2)
+                with fake._lock:
+                    delay = fake.latency + fake.random.uniform(0, fake.jitter)
+                    failed = fake.random.random() < fake.error_rate
+                time.sleep(delay)
+                fake._count(method, failed)
+                if failed:
+                    return self._send(503, {"error": {"code": 503, "message": "Injected failure", "status": "UNAVAILABLE"}})
+
+                if method == "generateContent":
+                    return self._send(200, _candidate(generate_reply(_prompt_text(body))))
+                if method == "streamGenerateContent":
+                    text = generate_reply(_prompt_text(body))
+                    size = fake.stream_chunk_chars
+                    chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+                    return self._send(200, [_candidate(chunk, i == len(chunks) - 1) for i, chunk in enumerate(chunks)])
+                if method == "embedContent":
+                    return self._send(200, {"embedding": {"values": _embedding(_content_text(body.get("content", {})))}})
+                if method == "batchEmbedContents":
+                    return self._send(200, {"embeddings": [
+                        {"values": _embedding(_content_text(request.get("content", {})))} for request in body.get("requests", [])
+                    ]})
+                return self._send(404, {"error": {"code": 404, "message": f"Unsupported method {method}"}})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini REST API")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    fake = FakeGemini(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"🤖 Fake Gemini on {fake.endpoint}")
+    print(f"💡 Start the API with GEMINI_API_ENDPOINT={fake.endpoint} GEMINI_TRANSPORT=rest")
+    fake.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
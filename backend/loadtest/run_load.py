@@ -0,0 +1,268 @@
+"""
+Drive the real upload -> process -> status -> reports flow under load.
+
+By default a fake Gemini server and a gunicorn instance of the API (pointed at
+it, with throwaway data folders) are started locally; pass --base-url to load
+an already running server instead.
+
+    python -m loadtest --analyses 20 --concurrency 4 --rate 0.5 --latency 0.8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+
+from .fake_gemini import FakeGemini
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "timed_out")
+STEPS = ("upload", "process", "analysis", "report", "total")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(fake_endpoint, workers, data_root, embedding_backend):
+    """Start gunicorn with the API pointed at the fake Gemini endpoint; returns (process, base_url)."""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        BIND=f"127.0.0.1:{port}",
+        WEB_CONCURRENCY=str(workers),
+        GEMINI_API_KEY="loadtest",
+        GEMINI_API_ENDPOINT=fake_endpoint,
+        GEMINI_TRANSPORT="rest",
+        EMBEDDING_BACKEND=embedding_backend,
+        UPLOAD_FOLDER=os.path.join(data_root, "data"),
+        RESULTS_FOLDER=os.path.join(data_root, "results"),
+        STANDARDS_FOLDER=os.path.join(data_root, "standards"),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", os.devnull],
+        cwd=BACKEND_DIR, env=env,
+        stdout=open(os.path.join(data_root, "server.log"), "w"), stderr=subprocess.STDOUT
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited early, see {os.path.join(data_root, 'server.log')}")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy within 60s")
+
+
+def run_analysis(base_url, curriculum, standards, poll_interval, timeout):
+    """One full analysis; returns a record of step latencies and the outcome."""
+    record = {"status": None, "error": None, "failed_step": None, "status_polls": [], "started": time.time()}
+    session = requests.Session()
+    step = "upload"
+    try:
+        t0 = time.perf_counter()
+        with open(curriculum, "rb") as c, open(standards, "rb") as s:
+            r = session.post(f"{base_url}/api/upload", files={"curriculum": c, "standards": s}, timeout=60)
+        r.raise_for_status()
+        upload = r.json()
+        t1 = time.perf_counter()
+        record["upload"] = t1 - t0
+
+        step = "process"
+        r = session.post(f"{base_url}/api/process", json={
+            "session_id": upload["session_id"],
+            "curriculum": upload["files"]["curriculum"],
+            "standards": upload["files"]["standards"],
+        }, timeout=60)
+        r.raise_for_status()
+        t2 = time.perf_counter()
+        record["process"] = t2 - t1
+
+        step = "analysis"
+        while True:
+            poll_start = time.perf_counter()
+            r = session.get(f"{base_url}/api/status/{upload['session_id']}", timeout=60)
+            record["status_polls"].append(time.perf_counter() - poll_start)
+            r.raise_for_status()
+            status = r.json()
+            if status.get("status") in TERMINAL_STATUSES:
+                break
+            if time.perf_counter() - t2 > timeout:
+                raise TimeoutError(f"Analysis still {status.get('status')} after {timeout}s")
+            time.sleep(poll_interval)
+        t3 = time.perf_counter()
+        record["analysis"] = t3 - t2
+        record["status"] = status["status"]
+        if status["status"] != "completed":
+            record["error"] = status.get("message")
+            return record
+
+        step = "report"
+        r = session.get(f"{base_url}/api/reports/{upload['session_id']}", timeout=60)
+        r.raise_for_status()
+        t4 = time.perf_counter()
+        record["report"] = t4 - t3
+        record["total"] = t4 - t0
+    except Exception as e:
+        record["status"] = "error"
+        record["failed_step"] = step
+        record["error"] = str(e)
+    return record
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 1),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+
+
+def summarize(records, duration):
+    outcomes = {}
+    for record in records:
+        outcomes[record["status"]] = outcomes.get(record["status"], 0) + 1
+    completed = outcomes.get("completed", 0)
+    latencies = {step: percentiles([r[step] for r in records if step in r]) for step in STEPS}
+    latencies["status_poll"] = percentiles([t for r in records for t in r["status_polls"]])
+    return {
+        "duration_s": round(duration, 2),
+        "analyses": len(records),
+        "outcomes": outcomes,
+        "error_rate": round(1 - completed / len(records), 4) if records else 0.0,
+        "throughput_per_min": round(completed / duration * 60, 2) if duration else 0.0,
+        "latency": latencies,
+        "errors": [
+            {"step": r["failed_step"] or r["status"], "error": r["error"]}
+            for r in records if r["status"] != "completed"
+        ][:50],
+    }
+
+
+def drive(base_url, analyses, concurrency, rate, curriculum, standards, poll_interval, timeout):
+    """Start `analyses` runs at `rate` per second (0 = back to back), at most `concurrency` at once."""
+    records = []
+    lock = threading.Lock()
+
+    def job(scheduled):
+        record = run_analysis(base_url, curriculum, standards, poll_interval, timeout)
+        record["queue_wait"] = max(0.0, record["started"] - scheduled)
+        with lock:
+            records.append(record)
+            print(f"  [{len(records)}/{analyses}] {record['status']}"
+                  + (f" in {record['total']:.1f}s" if "total" in record else f": {record['error']}"))
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(analyses):
+            scheduled = start + (i / rate if rate > 0 else 0)
+            time.sleep(max(0.0, scheduled - time.time()))
+            pool.submit(job, scheduled)
+    duration = time.time() - start
+
+    summary = summarize(records, duration)
+    summary["latency"]["queue_wait"] = percentiles([r["queue_wait"] for r in records])
+    return summary
+
+
+def print_summary(summary):
+    print("=" * 72)
+    print(f"Analyses: {summary['analyses']}  outcomes: {summary['outcomes']}  "
+          f"error rate: {summary['error_rate']:.1%}")
+    print(f"Duration: {summary['duration_s']}s  throughput: {summary['throughput_per_min']} analyses/min")
+    print(f"{'step':<12}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for step, stats in summary["latency"].items():
+        if stats:
+            print(f"{step:<12}{stats['count']:>7}{stats['p50_ms']:>11}{stats['p95_ms']:>11}"
+                  f"{stats['p99_ms']:>11}{stats['max_ms']:>11}")
+    print("=" * 72)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Curriculum Gap Identifier API")
+    parser.add_argument("--base-url", help="Load an already running API instead of starting one")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the local server")
+    parser.add_argument("--embedding-backend", default="gemini", choices=("gemini", "local"))
+    parser.add_argument("--analyses", type=int, default=10, help="Number of analyses to run")
+    parser.add_argument("--concurrency", type=int, default=2, help="Maximum analyses in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Arrivals per second (0 = back to back)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra random latency per call, up to (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Gemini calls failing with 503")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for injected latency and errors")
+    parser.add_argument("--curriculum", default=os.path.join(BACKEND_DIR, "data", "curriculum_1c0ce7a0.pdf"))
+    parser.add_argument("--standards", default=os.path.join(BACKEND_DIR, "data", "standards_1c0ce7a0.pdf"))
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=600, help="Give up on an analysis after this long (s)")
+    parser.add_argument("--output", help="Results file (default loadtest/results/<timestamp>.json)")
+    parser.add_argument("--keep-data", action="store_true",
+                        help="Keep the local server's data folders and log (kept anyway when the run fails)")
+    args = parser.parse_args(argv)
+
+    fake = server = data_root = None
+    finished = False
+    try:
+        base_url = args.base_url
+        if not base_url:
+            data_root = tempfile.mkdtemp(prefix="cgi_loadtest_")
+            fake = FakeGemini(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              seed=args.seed).start()
+            print(f"🤖 Fake Gemini on {fake.endpoint}")
+            server, base_url = start_server(fake.endpoint, args.workers, data_root, args.embedding_backend)
+            print(f"🚀 API on {base_url} ({args.workers} workers, data in {data_root})")
+
+        summary = drive(base_url, args.analyses, args.concurrency, args.rate, args.curriculum, args.standards,
+                        args.poll_interval, args.timeout)
+        finished = True
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+        if fake:
+            fake.stop()
+        if data_root:
+            if finished and not args.keep_data:
+                shutil.rmtree(data_root, ignore_errors=True)
+            else:
+                print(f"📁 Server data and log kept in {data_root}")
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "fake_gemini_calls": fake.stats if fake else None,
+        **summary,
+    }
+    print_summary(summary)
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, "loadtest", "results", f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"📄 Results saved to {output}")
+    return result
@@ -9,7 +9,7 @@ import sys
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from api import app
+from api import create_app
 
 if __name__ == '__main__':
     # Check for required environment variables
@@ -31,4 +31,6 @@ if __name__ == '__main__':
     print("🚀 Starting server on http://localhost:5000")
     print("=" * 50)
     
-    app.run(debug=True, port=5000, use_reloader=True)
\ No newline at end of file
+    # Development server only; use `gunicorn -c gunicorn.conf.py` in production
+    debug = os.getenv('FLASK_DEBUG', 'true').lower() in ('1', 'true', 'yes')
+    create_app().run(debug=debug, port=5000, use_reloader=debug)
@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime
+
+# Session artifacts live in <root>/<first two characters of the id>/<session_id>/,
+# so no directory grows past a few hundred entries. Sessions written before
+# sharding stay readable from the flat <root>/<file> layout until the compactor
+# moves them (RETENTION_MIGRATE_LEGACY).
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Flat files that belong to a session: "<id>_<artifact>" in results/,
+# "curriculum_<id>.<ext>" / "standards_<id>_rev<n>.<ext>" in data/
+LEGACY_FILE_PATTERN = re.compile(r"^(?:curriculum_|standards_)?([0-9a-f]{8})(?=[_.])")
+LEGACY_PROBES = ("{id}_curriculum.txt", "{id}_curriculum.json", "{id}_report.json", "curriculum_{id}.pdf")
+
+# A retention lock older than this is assumed to belong to a pass that died
+RETENTION_LOCK_STALE_S = 6 * 3600
+
+HOST = socket.gethostname()
+
+
+def pid_alive(pid):
+    """Whether process `pid` on this host is still running (always True on Windows)."""
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        pass
+    return True
+
+
+def shard_name(session_id):
+    return (session_id + "__")[:2]
+
+
+def session_dir(root, session_id):
+    if not SESSION_ID_PATTERN.match(session_id or ""):
+        raise ValueError(f"Invalid session_id: {session_id!r}")
+    return os.path.join(root, shard_name(session_id), session_id)
+
+
+def _has_legacy_files(root, session_id):
+    return any(os.path.exists(os.path.join(root, probe.format(id=session_id))) for probe in LEGACY_PROBES)
+
+
+def session_root(root, session_id, create=False):
+    """Directory holding a session's artifacts under `root`.
+
+    That is the session's shard directory (created when `create` is set), or
+    `root` itself for a session still stored flat from before sharding.
+    """
+    directory = session_dir(root, session_id)
+    if os.path.isdir(directory):
+        return directory
+    if _has_legacy_files(root, session_id):
+        return root
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def session_path(root, session_id, filename, create=False):
+    return os.path.join(session_root(root, session_id, create), filename)
+
+
+def touch_session(root, session_id):
+    """Mark a session as recently used, for LRU eviction."""
+    try:
+        os.utime(session_dir(root, session_id))
+    except (OSError, ValueError):
+        pass
+
+
+def _scan_session(directory):
+    files, size, last_used = 0, 0, os.stat(directory).st_mtime
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, name))
+            except FileNotFoundError:
+                continue
+            files += 1
+            size += stat.st_size
+            last_used = max(last_used, stat.st_mtime)
+    return files, size, last_used
+
+
+class RetentionManager:
+    """Background compactor for the upload and results folders.
+
+    Each pass moves flat legacy files into session directories (when
+    `migrate_legacy` is set), deletes sessions unused for longer than
+    `ttl_seconds`, and then evicts the least recently used sessions until the
+    total size fits in `quota_bytes`.
+    Sessions that are processing, or that were used within `grace_seconds`,
+    are never touched. One process at a time compacts; the others skip the
+    pass. Usage figures from the last pass are written to `stats_path`.
+    """
+
+    def __init__(self, upload_root, results_root, task_store, ttl_seconds=0, quota_bytes=0,
+                 interval_seconds=3600, grace_seconds=3600, migrate_legacy=False):
+        self.roots = {"uploads": upload_root, "results": results_root}
+        self.task_store = task_store
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self.migrate_legacy_files = migrate_legacy
+        self.stats_path = os.path.join(results_root, "retention_stats.json")
+        self.lock_path = os.path.join(results_root, ".retention.lock")
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def ensure_running(self):
+        """Start the compactor thread in this process (again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Retention pass failed: {e}")
+            time.sleep(self.interval_seconds)
+
+    def is_active(self, session_id, last_used, now):
+        return now - last_used < self.grace_seconds or self.task_store.is_processing(session_id)
+
+    def migrate_legacy(self, now):
+        """Move flat session files into their session directories, a whole session at a time."""
+        moved = 0
+        for root in self.roots.values():
+            if not os.path.isdir(root):
+                continue
+            flat = {}
+            for entry in os.scandir(root):
+                match = LEGACY_FILE_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    flat.setdefault(match.group(1), []).append(entry)
+            for session_id, entries in flat.items():
+                if self.is_active(session_id, max(e.stat().st_mtime for e in entries), now):
+                    continue
+                directory = session_dir(root, session_id)
+                os.makedirs(directory, exist_ok=True)
+                for entry in entries:
+                    os.replace(entry.path, os.path.join(directory, entry.name))
+                moved += len(entries)
+        return moved
+
+    def scan(self):
+        """{session_id: {"files", "bytes", "last_used", "dirs"}} over all sharded sessions."""
+        sessions = {}
+        for root in self.roots.values():
+            if not os.path.isdir(root):
+                continue
+            for shard in os.scandir(root):
+                if len(shard.name) != 2 or not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if not entry.is_dir():
+                        continue
+                    files, size, last_used = _scan_session(entry.path)
+                    session = sessions.setdefault(entry.name, {"files": 0, "bytes": 0, "last_used": 0, "dirs": []})
+                    session["files"] += files
+                    session["bytes"] += size
+                    session["last_used"] = max(session["last_used"], last_used)
+                    session["dirs"].append(entry.path)
+        return sessions
+
+    def evict(self, session_id, session):
+        for directory in session["dirs"]:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.task_store.delete(session_id)
+
+    def compact(self):
+        """Run one pass if no other process is running one; returns the stats (or None when skipped)."""
+        if not self._acquire_lock():
+            return None
+        try:
+            return self._compact()
+        finally:
+            try:
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+
+    # The lock is a file created exclusively (portable, unlike flock); it names
+    # its owner so a lock left behind by a killed process can be taken over
+    def _acquire_lock(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._lock_is_stale():
+                    return False
+                try:
+                    os.remove(self.lock_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"host": HOST, "pid": os.getpid()}, f)
+            return True
+        return False
+
+    def _lock_is_stale(self):
+        try:
+            age = time.time() - os.path.getmtime(self.lock_path)
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            # Being written right now, or left half-written by a crash
+            return age > 60
+        if age > RETENTION_LOCK_STALE_S:
+            return True
+        return owner.get("host") == HOST and not pid_alive(owner.get("pid"))
+
+    def _compact(self):
+        started = time.time()
+        moved = self.migrate_legacy(started) if self.migrate_legacy_files else 0
+        sessions = self.scan()
+        evicted = {"ttl": 0, "quota": 0}
+        freed = 0
+
+        # Least recently used first; the status file is only read for sessions about to go
+        candidates = sorted(
+            (item for item in sessions.items() if started - item[1]["last_used"] >= self.grace_seconds),
+            key=lambda item: item[1]["last_used"]
+        )
+        total = sum(s["bytes"] for s in sessions.values())
+        for session_id, session in candidates:
+            if self.ttl_seconds and started - session["last_used"] > self.ttl_seconds:
+                reason = "ttl"
+            elif self.quota_bytes and total > self.quota_bytes:
+                reason = "quota"
+            else:
+                continue
+            if self.task_store.is_processing(session_id):
+                continue
+            self.evict(session_id, session)
+            evicted[reason] += 1
+            total -= session["bytes"]
+            freed += session["bytes"]
+            del sessions[session_id]
+
+        stats = {
+            "timestamp": datetime.now().isoformat(),
+            "duration_s": round(time.time() - started, 3),
+            "sessions": len(sessions),
+            "files": sum(s["files"] for s in sessions.values()),
+            "bytes": total,
+            "quota_bytes": self.quota_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "oldest_last_used": datetime.fromtimestamp(min(s["last_used"] for s in sessions.values())).isoformat()
+            if sessions else None,
+            "legacy_files_moved": moved,
+            "evicted": evicted,
+            "bytes_freed": freed,
+        }
+        with open(self.stats_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        os.replace(self.stats_path + ".tmp", self.stats_path)
+        if moved or freed:
+            print(f"🧹 Retention: moved {moved} legacy files, evicted {evicted}, freed {freed} bytes")
+        return stats
+
+    def last_stats(self):
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
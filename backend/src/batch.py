@@ -0,0 +1,64 @@
+"""
+Analyse a whole directory (or manifest) of curricula against one standards document.
+
+    python -m src.batch --input syllabi/ --standards data/standards.pdf --output results/batch_fall
+    python -m src.batch --manifest courses.csv --standards-id std_1a2b3c4d --workers 8 --model-concurrency 4
+
+The standards document is structured once (and, with the Gemini embedding
+backend, embedded once) through the standards registry and shared by every course. Courses run in a process pool; at most
+`--model-concurrency` of them are in a Gemini-calling stage at any time.
+Each course writes its reports to <output>/<course_id>/, and
+<output>/batch_manifest.json records every finished course, so running the
+same command again resumes where an interrupted run stopped.
+"""
+
+import argparse
+import os
+import sys
+
+from .config import STANDARDS_FOLDER, configure_gemini
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many curricula against one standards document")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory of curricula (.pdf, .docx, .txt), searched recursively")
+    source.add_argument("--manifest", help="CSV with a `curriculum` column and an optional `course_id` column")
+    standards = parser.add_mutually_exclusive_group(required=True)
+    standards.add_argument("--standards", help="Standards document, registered once for the whole run")
+    standards.add_argument("--standards-id", help="Already registered standards (see /api/standards)")
+    parser.add_argument("--standards-folder", default=STANDARDS_FOLDER, help="Standards registry folder")
+    parser.add_argument("--output", default=os.path.join("results", "batch"), help="Output and checkpoint folder")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Courses analysed in parallel")
+    parser.add_argument("--model-concurrency", type=int, default=4,
+                        help="Courses in a Gemini-calling stage (structuring, similarity, recommendations) at once")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry courses that failed in an earlier run")
+    args = parser.parse_args(argv)
+
+    # Imported here rather than at module level: each process of the pool, and each
+    # extraction/rendering child of those, re-imports this module as __mp_main__
+    from .batch_runner import (MANIFEST_NAME, discover_courses, load_checkpoint, prepare_standards,
+                               print_summary, run_batch, save_checkpoint)
+
+    configure_gemini()
+    os.makedirs(args.output, exist_ok=True)
+    try:
+        courses = discover_courses(args.input, args.manifest)
+        checkpoint = load_checkpoint(args.output)
+        standards_id = prepare_standards(checkpoint, args.standards, args.standards_id, args.standards_folder)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    save_checkpoint(args.output, checkpoint)
+
+    try:
+        summary = run_batch(courses, standards_id, args.output, max(1, args.workers), max(1, args.model_concurrency),
+                            args.standards_folder, checkpoint, retry_failed=not args.skip_failed)
+    except KeyboardInterrupt:
+        return 130
+    print_summary(summary)
+    print(f"📄 Checkpoint manifest: {os.path.join(args.output, MANIFEST_NAME)}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
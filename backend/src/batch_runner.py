@@ -0,0 +1,271 @@
+"""
+Course discovery, checkpointing and the process pool behind `python -m src.batch`.
+
+Kept apart from the CLI module (src.batch), which every process of the pool
+re-imports as `__mp_main__`.
+"""
+
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from . import pipeline, standards_registry
+from .cancellation import CancellationToken
+from .config import STAGE_TIMEOUTS, STANDARDS_FOLDER, configure_gemini
+from .extract import extract_text
+from .structure_ai import structure_content
+
+CURRICULUM_EXTENSIONS = (".pdf", ".docx", ".txt")
+MANIFEST_NAME = "batch_manifest.json"
+
+# Set in each pool process by _init_worker
+_model_slots = None
+_standards = {}
+
+
+def course_id_for(relative_path):
+    """Readable, unique and stable id for a curriculum file, e.g. "cs_intro_3f2a9c"."""
+    stem = os.path.splitext(relative_path)[0]
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", stem).strip("_")[:48] or "course"
+    digest = hashlib.sha1(relative_path.replace(os.sep, "/").encode("utf-8")).hexdigest()[:6]
+    return f"{slug}_{digest}"
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def discover_courses(input_dir=None, manifest=None):
+    """[{"id", "path"}] from a directory tree of curricula, or from a CSV manifest
+    with a `curriculum` column (path, relative to the manifest) and an optional `course_id`."""
+    courses = []
+    if input_dir:
+        for dirpath, dirnames, filenames in os.walk(input_dir):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(CURRICULUM_EXTENSIONS):
+                    path = os.path.join(dirpath, name)
+                    courses.append({"id": course_id_for(os.path.relpath(path, input_dir)), "path": path})
+    else:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                if not (row.get("curriculum") or "").strip():
+                    continue
+                path = os.path.join(base, row["curriculum"].strip())
+                course_id = (row.get("course_id") or "").strip() or course_id_for(row["curriculum"].strip())
+                courses.append({"id": course_id, "path": path})
+
+    seen = set()
+    for course in courses:
+        if not standards_registry.STANDARDS_ID_PATTERN.match(course["id"]):
+            raise ValueError(f"Invalid course_id {course['id']!r} (letters, digits, _ and -, up to 64)")
+        if course["id"] in seen:
+            raise ValueError(f"Duplicate course_id {course['id']!r}")
+        seen.add(course["id"])
+    return courses
+
+
+def load_checkpoint(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"courses": {}, "runs": []}
+
+
+def save_checkpoint(output_dir, checkpoint):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def prepare_standards(checkpoint, standards_path=None, standards_id=None, root=STANDARDS_FOLDER):
+    """Registered standards id for this run; a standards file is registered once and
+    reused by every resumed run of the same output folder."""
+    if standards_id:
+        if not standards_registry.is_ready(standards_id, root):
+            raise ValueError(f"Registered standards {standards_id!r} not found or not ready")
+        source = {"standards_id": standards_id}
+    else:
+        source = {"path": os.path.abspath(standards_path), "fingerprint": fingerprint(standards_path)}
+
+    previous = checkpoint.get("standards")
+    if previous and previous["source"] != source:
+        raise ValueError("This output folder was started with different standards; use a new --output")
+    if previous and standards_registry.is_ready(previous["id"], root):
+        return previous["id"]
+
+    if not standards_id:
+        print(f"🤖 Registering standards {standards_path}...")
+        standards_id = standards_registry.create_entry(None, os.path.basename(standards_path), root=root)
+        standards_registry.ingest_standards(standards_id, extract_text(standards_path), structure_content, root=root)
+    checkpoint["standards"] = {"id": standards_id, "source": source}
+    return standards_id
+
+
+def _init_worker(model_slots):
+    global _model_slots
+    _model_slots = model_slots
+    configure_gemini()
+
+
+@contextmanager
+def _stage(token, timings, name):
+    """Time a stage under its deadline; model stages first wait for a shared model slot."""
+    started = time.perf_counter()
+    if name in pipeline.MODEL_STAGES and _model_slots is not None:
+        with _model_slots:
+            _add_time(timings, f"{name}_wait", started)
+            started = time.perf_counter()
+            with token.stage(name, STAGE_TIMEOUTS[name]):
+                yield
+    else:
+        with token.stage(name, STAGE_TIMEOUTS[name]):
+            yield
+    _add_time(timings, name, started)
+
+
+def _add_time(timings, name, started):
+    # A stage can run more than once per course (e.g. topic and hierarchical similarity)
+    timings[name] = round(timings.get(name, 0.0) + time.perf_counter() - started, 3)
+
+
+def _load_standards(standards_id, root):
+    """Structure and embeddings of the registered standards, once per pool process."""
+    if standards_id not in _standards:
+        structured = standards_registry.load_structure(standards_id, root)
+        backend, vectors = standards_registry.load_embeddings(standards_id, root=root)
+        _standards[standards_id] = (structured, backend, vectors)
+    return _standards[standards_id]
+
+
+def analyse_course(course, standards_id, standards_root, output_dir):
+    """Run the full analysis for one curriculum; returns its checkpoint record."""
+    started = time.perf_counter()
+    timings = {}
+    token = CancellationToken()
+    course_id = course["id"]
+    course_dir = os.path.join(output_dir, course_id)
+    os.makedirs(course_dir, exist_ok=True)
+
+    def out(suffix):
+        return os.path.join(course_dir, f"{course_id}_{suffix}")
+
+    outputs, summary = pipeline.run_analysis(
+        course_id, course["path"], out, token,
+        standards=_load_standards(standards_id, standards_root),
+        stage=lambda name: _stage(token, timings, name),
+        extra_report={"source": course["path"], "standards_id": standards_id}
+    )
+
+    return {
+        "status": "completed",
+        "source": course["path"],
+        "fingerprint": fingerprint(course["path"]),
+        "outputs": {"json": outputs["json"], "pdf": outputs["pdf"]},
+        "summary": summary,
+        "stages": timings,
+        "duration_s": round(time.perf_counter() - started, 3),
+        "completed": datetime.now().isoformat()
+    }
+
+
+def is_done(record, course):
+    """Finished in an earlier run, from the same file, with its report still on disk."""
+    return bool(record) and record.get("status") == "completed" \
+        and record.get("fingerprint") == fingerprint(course["path"]) \
+        and all(os.path.exists(path) for path in record["outputs"].values())
+
+
+def summarize_run(records, duration, skipped):
+    durations = np.asarray([r["duration_s"] for r in records if r["status"] == "completed"])
+    stages = {}
+    for record in records:
+        for name, seconds in record.get("stages", {}).items():
+            stages[name] = round(stages.get(name, 0.0) + seconds, 3)
+    completed = len(durations)
+    return {
+        "duration_s": round(duration, 2),
+        "courses": len(records) + skipped,
+        "completed": completed,
+        "failed": len(records) - completed,
+        "skipped": skipped,
+        "throughput_per_min": round(completed / duration * 60, 2) if duration else 0.0,
+        "course_duration_s": {
+            "mean": round(float(durations.mean()), 2),
+            "p50": round(float(np.percentile(durations, 50)), 2),
+            "p95": round(float(np.percentile(durations, 95)), 2),
+            "max": round(float(durations.max()), 2),
+        } if completed else None,
+        "stage_seconds": stages,
+    }
+
+
+def print_summary(summary):
+    print("=" * 72)
+    print(f"Courses: {summary['courses']}  completed: {summary['completed']}  failed: {summary['failed']}  "
+          f"already done: {summary['skipped']}")
+    print(f"Duration: {summary['duration_s']}s  throughput: {summary['throughput_per_min']} courses/min")
+    if summary["course_duration_s"]:
+        d = summary["course_duration_s"]
+        print(f"Per course: mean {d['mean']}s  p50 {d['p50']}s  p95 {d['p95']}s  max {d['max']}s")
+    if summary["stage_seconds"]:
+        print("Stage time (summed over courses): "
+              + ", ".join(f"{name} {seconds}s" for name, seconds in summary["stage_seconds"].items()))
+    print("=" * 72)
+
+
+def run_batch(courses, standards_id, output_dir, workers, model_concurrency,
+              standards_root=STANDARDS_FOLDER, checkpoint=None, retry_failed=True):
+    """Analyse every course not finished yet; the checkpoint is saved after each course."""
+    checkpoint = checkpoint or load_checkpoint(output_dir)
+    done = checkpoint.setdefault("courses", {})
+    pending = [c for c in courses
+               if not is_done(done.get(c["id"]), c)
+               and (retry_failed or (done.get(c["id"]) or {}).get("status") != "failed")]
+    skipped = len(courses) - len(pending)
+    print(f"📚 {len(courses)} courses: {skipped} already done, {len(pending)} to analyse "
+          f"({workers} workers, {model_concurrency} in model stages at once)")
+
+    records = []
+    started = time.time()
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                               initargs=(context.BoundedSemaphore(model_concurrency),))
+    try:
+        futures = {pool.submit(analyse_course, course, standards_id, standards_root, output_dir): course
+                   for course in pending}
+        for future in as_completed(futures):
+            course = futures[future]
+            try:
+                record = future.result()
+                print(f"  [{len(records) + 1}/{len(pending)}] ✅ {course['id']} in {record['duration_s']:.1f}s")
+            except Exception as e:
+                record = {"status": "failed", "source": course["path"], "error": f"{type(e).__name__}: {e}",
+                          "duration_s": 0.0, "completed": datetime.now().isoformat()}
+                print(f"  [{len(records) + 1}/{len(pending)}] ❌ {course['id']}: {record['error']}")
+            records.append(record)
+            done[course["id"]] = record
+            save_checkpoint(output_dir, checkpoint)
+    except KeyboardInterrupt:
+        print("🛑 Interrupted; finished courses are checkpointed, run the same command to resume")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    summary = summarize_run(records, time.time() - started, skipped)
+    checkpoint.setdefault("runs", []).append({"timestamp": datetime.now().isoformat(), **summary})
+    save_checkpoint(output_dir, checkpoint)
+    return summary
@@ -0,0 +1,102 @@
+import multiprocessing
+import time
+from contextlib import contextmanager
+
+# How often the (file-backed) cancel flag is actually read
+CANCEL_POLL_INTERVAL = 0.5
+
+# Child processes are spawned, not forked, so no locks or gRPC channels of the
+# multi-threaded server are inherited
+_process_context = multiprocessing.get_context("spawn")
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage, seconds):
+        super().__init__(f"Stage '{stage}' exceeded its {seconds:g}s deadline")
+        self.stage = stage
+
+
+class CancellationToken:
+    """Cooperative cancellation plus the deadline of the stage currently running.
+
+    `is_cancelled` is polled at most every CANCEL_POLL_INTERVAL seconds, so
+    check() is cheap enough to call inside loops.
+    """
+
+    def __init__(self, is_cancelled=None):
+        self._is_cancelled = is_cancelled or (lambda: False)
+        self._cancelled = False
+        self._last_poll = 0.0
+        self.stage_name = None
+        self.timeout = None
+        self.deadline = None
+
+    def cancelled(self):
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_poll >= CANCEL_POLL_INTERVAL:
+            self._last_poll = now
+            self._cancelled = bool(self._is_cancelled())
+        return self._cancelled
+
+    def remaining(self):
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled():
+            raise AnalysisCancelled(f"Cancelled during {self.stage_name or 'startup'}")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise StageTimeout(self.stage_name, self.timeout)
+
+    @contextmanager
+    def stage(self, name, timeout):
+        """Run a block as stage `name`, which must finish within `timeout` seconds.
+
+        The deadline is checked on entry and again on exit, so a block that
+        overran without checking still ends in StageTimeout.
+        """
+        self.stage_name, self.timeout, self.deadline = name, timeout, time.monotonic() + timeout
+        self.check()
+        try:
+            yield self
+            self.check()
+        finally:
+            self.deadline = None
+
+
+def _run_child(connection, target, args):
+    try:
+        connection.send((True, target(*args)))
+    except Exception as e:
+        connection.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+def run_in_process(token, target, *args):
+    """Run `target(*args)` in a child process that is killed on cancellation or
+    when the current stage's deadline passes. `target` and its result must be picklable."""
+    receiver, sender = _process_context.Pipe(duplex=False)
+    process = _process_context.Process(target=_run_child, args=(sender, target, args), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        # poll() is also true at EOF, i.e. when the child died without sending a result
+        while not receiver.poll(0.2):
+            token.check()
+        try:
+            ok, value = receiver.recv()
+        except EOFError:
+            process.join()
+            raise RuntimeError(f"Worker process exited unexpectedly (exit code {process.exitcode})") from None
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+    if not ok:
+        raise RuntimeError(value)
+    return value
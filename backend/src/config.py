@@ -5,5 +5,109 @@ load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("❌ ERROR: GEMINI_API_KEY is missing. Set it in .env file.")
+# Folders for uploads, generated results and per-session task status
+# (the status folder defaults to <RESULTS_FOLDER>/status)
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "data")
+RESULTS_FOLDER = os.getenv("RESULTS_FOLDER", "results")
+STATUS_FOLDER = os.getenv("STATUS_FOLDER")
+
+# Origins allowed to call the API (comma separated)
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",") if o.strip()]
+
+
+# Alternative Gemini endpoint and transport ("grpc" or "rest"), e.g. the local
+# stand-in used by the load test: GEMINI_API_ENDPOINT=http://127.0.0.1:8089 GEMINI_TRANSPORT=rest
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT")
+
+
+def configure_gemini(api_key=None, api_endpoint=None, transport=None):
+    """Configure the Gemini client once at startup; raises when no key is available."""
+    api_key = api_key or GEMINI_API_KEY
+    if not api_key:
+        raise ValueError("❌ ERROR: GEMINI_API_KEY is missing. Set it in .env file.")
+
+    import google.generativeai as genai
+    api_endpoint = api_endpoint or GEMINI_API_ENDPOINT
+    genai.configure(
+        api_key=api_key,
+        transport=transport or GEMINI_TRANSPORT,
+        client_options={"api_endpoint": api_endpoint} if api_endpoint else None
+    )
+    return api_key
+
+# Number of pre-serialized report/mapping responses kept in memory per process
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "128"))
+
+# Embedding backend used for similarity: "gemini" (remote) or "local" (offline, CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+
+# Dimensionality of local (TF-IDF + SVD) embeddings
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "256"))
+
+# Local fits kept per registered standards document (one per standards + curriculum corpus)
+LOCAL_FIT_CACHE_MAX = int(os.getenv("LOCAL_FIT_CACHE_MAX", "16"))
+
+# Standard topics whose best token-set Jaccard reaches this are matched without embeddings
+LEXICAL_OVERLAP_THRESHOLD = float(os.getenv("LEXICAL_OVERLAP_THRESHOLD", "0.8"))
+
+# Match subtopics, competencies and learning outcomes within matched topic branches
+HIERARCHICAL_MATCHING = os.getenv("HIERARCHICAL_MATCHING", "false").lower() in ("1", "true", "yes")
+
+# Memory ceiling for a single block of the hierarchical score products
+MATCH_MEMORY_LIMIT_MB = int(os.getenv("MATCH_MEMORY_LIMIT_MB", "64"))
+
+# A curriculum topic branch is searched when it is the best match of a standard
+# topic, or among its top-k matches and scoring at least the branch threshold
+HIERARCHY_TOP_K = int(os.getenv("HIERARCHY_TOP_K", "3"))
+HIERARCHY_BRANCH_THRESHOLD = float(os.getenv("HIERARCHY_BRANCH_THRESHOLD", "0.5"))
+
+# Similarity cut-offs for "Fully aligned" and "Partial match"
+FULL_ALIGNMENT_THRESHOLD = float(os.getenv("FULL_ALIGNMENT_THRESHOLD", "0.80"))
+PARTIAL_MATCH_THRESHOLD = float(os.getenv("PARTIAL_MATCH_THRESHOLD", "0.60"))
+
+# Missing topics below these similarities are HIGH / MEDIUM severity gaps (LOW otherwise)
+GAP_SEVERITY_HIGH_BELOW = float(os.getenv("GAP_SEVERITY_HIGH_BELOW", "0.3"))
+GAP_SEVERITY_MEDIUM_BELOW = float(os.getenv("GAP_SEVERITY_MEDIUM_BELOW", "0.6"))
+
+# Pre-registered standards documents with their structure and topic embeddings
+STANDARDS_FOLDER = os.getenv("STANDARDS_FOLDER", "standards")
+
+# Recommendations are generated in concurrent per-gap shards plus one synthesis call
+RECOMMENDATION_CONCURRENCY = int(os.getenv("RECOMMENDATION_CONCURRENCY", "4"))
+RECOMMENDATION_SHARD_TOKENS = int(os.getenv("RECOMMENDATION_SHARD_TOKENS", "600"))
+RECOMMENDATION_PROMPT_TOKEN_BUDGET = int(os.getenv("RECOMMENDATION_PROMPT_TOKEN_BUDGET", "8000"))
+
+# Analyses running at once per server process; further requests wait for a slot
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+
+# A running analysis refreshes its heartbeat every TASK_HEARTBEAT_S; a processing
+# status without a beat for TASK_STALE_AFTER_S (its worker died) reads as failed
+TASK_HEARTBEAT_S = float(os.getenv("TASK_HEARTBEAT_S", "15"))
+TASK_STALE_AFTER_S = float(os.getenv("TASK_STALE_AFTER_S", "120"))
+
+# Deadline of each analysis stage in seconds; extraction and rendering run in a
+# child process that is killed when its deadline passes
+STAGE_TIMEOUTS = {
+    "extraction": float(os.getenv("EXTRACTION_TIMEOUT_S", "120")),
+    "structuring": float(os.getenv("STRUCTURING_TIMEOUT_S", "600")),
+    "similarity": float(os.getenv("SIMILARITY_TIMEOUT_S", "300")),
+    "recommendations": float(os.getenv("RECOMMENDATIONS_TIMEOUT_S", "600")),
+    "rendering": float(os.getenv("RENDERING_TIMEOUT_S", "120")),
+}
+
+# Upper bound on a single Gemini request, so a stuck call cannot outlive its stage
+GEMINI_REQUEST_TIMEOUT_S = float(os.getenv("GEMINI_REQUEST_TIMEOUT_S", "120"))
+
+# Retention of session artifacts in the upload and results folders: sessions
+# unused for RETENTION_TTL_DAYS are deleted, then the least recently used ones
+# until the total fits RETENTION_QUOTA_MB (0 disables either rule). Sessions that
+# are processing or were used within RETENTION_GRACE_S are never touched.
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "true").lower() in ("1", "true", "yes")
+RETENTION_TTL_DAYS = float(os.getenv("RETENTION_TTL_DAYS", "30"))
+RETENTION_QUOTA_MB = float(os.getenv("RETENTION_QUOTA_MB", "0"))
+RETENTION_INTERVAL_S = float(os.getenv("RETENTION_INTERVAL_S", "3600"))
+RETENTION_GRACE_S = float(os.getenv("RETENTION_GRACE_S", "3600"))
+
+# Move session files of the old flat layout into per-session folders
+RETENTION_MIGRATE_LEGACY = os.getenv("RETENTION_MIGRATE_LEGACY", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,185 @@
+import numpy as np
+from .similarity_engine import get_embedding_backend, alignment_status, normalize_topic
+from .config import MATCH_MEMORY_LIMIT_MB, HIERARCHY_BRANCH_THRESHOLD, HIERARCHY_TOP_K
+
+# Finer-grained lists produced by structure_content, matched below topic level
+LEVELS = ("subtopics", "competencies", "learning_outcomes")
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def blockwise_argmax(left, right, max_bytes):
+    """Row-wise best match of `left @ right.T` without materializing the full product.
+
+    The product is evaluated in (rows x cols) blocks whose float32 size stays
+    under `max_bytes`. Returns (best column per row, best score per row); rows
+    get -1 / -inf when `right` is empty.
+    """
+    n, m = len(left), len(right)
+    best_idx = np.full(n, -1, dtype=np.int64)
+    best_score = np.full(n, -np.inf, dtype=np.float32)
+    if n == 0 or m == 0:
+        return best_idx, best_score
+
+    cells = max(1, max_bytes // 4)
+    cols = min(m, cells)
+    rows = max(1, cells // cols)
+
+    for r in range(0, n, rows):
+        row_slice = slice(r, r + rows)
+        for c in range(0, m, cols):
+            block = left[row_slice] @ right[c:c + cols].T
+            idx = block.argmax(axis=1)
+            score = block[np.arange(len(idx)), idx]
+            better = score > best_score[row_slice]
+            best_idx[row_slice][better] = idx[better] + c
+            best_score[row_slice][better] = score[better]
+
+    return best_idx, best_score
+
+
+def compute_hierarchical_matches(curriculum_data, standard_data, backend=None,
+                                 max_bytes=None, branch_threshold=None, top_k=None, check=None,
+                                 thresholds=(None, None)):
+    """Match subtopics, competencies and learning outcomes within matched topic branches.
+
+    Topics are matched first. Every finer item is attached to the nearest topic
+    of its own document, and a standard item is only compared with curriculum
+    items whose parent topic is the best match, or among the top-k matches
+    above `branch_threshold`, of its own parent topic. All products are computed
+    blockwise under a memory ceiling, so work grows with branch sizes rather
+    than with the full standards x curriculum cross product. `check()` is called
+    while embedding and before every branch and may raise to abort. Row statuses
+    use the (full, partial) `thresholds`, the configured ones by default.
+
+    Returns {"levels": {level: [mapping rows]}, "stats": {...}}.
+    """
+    max_bytes = max_bytes or MATCH_MEMORY_LIMIT_MB * 1024 * 1024
+    branch_threshold = HIERARCHY_BRANCH_THRESHOLD if branch_threshold is None else branch_threshold
+    top_k = top_k or HIERARCHY_TOP_K
+
+    standard_topics = standard_data.get("topics") or []
+    curriculum_topics = curriculum_data.get("topics") or []
+    standard_items = {level: standard_data.get(level) or [] for level in LEVELS}
+    curriculum_items = {level: curriculum_data.get(level) or [] for level in LEVELS}
+
+    # Embed every text of both documents once
+    texts = list(standard_topics) + list(curriculum_topics)
+    for level in LEVELS:
+        texts += list(standard_items[level]) + list(curriculum_items[level])
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts:
+        return {"levels": {level: [] for level in LEVELS}, "stats": {}}
+
+    backend = backend or get_embedding_backend()
+    backend.fit(unique_texts)
+    vectors = _normalize_rows(backend.embed_many(unique_texts, check))
+    position = {text: i for i, text in enumerate(unique_texts)}
+
+    def vectors_for(items):
+        return vectors[[position[t] for t in items]] if items else np.zeros((0, vectors.shape[1]), dtype=vectors.dtype)
+
+    standard_topic_vectors = vectors_for(standard_topics)
+    curriculum_topic_vectors = vectors_for(curriculum_topics)
+
+    # Candidate curriculum branches for each standard branch
+    branch_candidates = []
+    for s in range(len(standard_topics)):
+        scores = curriculum_topic_vectors @ standard_topic_vectors[s]
+        ranked = np.argsort(-scores)[:top_k]
+        # The best branch is always searched so weak topic matches still get item matches
+        keep = scores[ranked] >= branch_threshold
+        keep[:1] = True
+        branch_candidates.append(ranked[keep])
+
+    levels = {}
+    stats = {"max_bytes": max_bytes, "levels": {}}
+
+    for level in LEVELS:
+        std_items = standard_items[level]
+        cur_items = curriculum_items[level]
+        std_vectors = vectors_for(std_items)
+        cur_vectors = vectors_for(cur_items)
+
+        std_parent, _ = blockwise_argmax(std_vectors, standard_topic_vectors, max_bytes)
+        cur_parent, _ = blockwise_argmax(cur_vectors, curriculum_topic_vectors, max_bytes)
+
+        rows = [None] * len(std_items)
+        pairs_scored = 0
+
+        for s in range(len(standard_topics)):
+            if check:
+                check()
+            branch_items = np.flatnonzero(std_parent == s)
+            if len(branch_items) == 0:
+                continue
+            candidates = np.flatnonzero(np.isin(cur_parent, branch_candidates[s]))
+            best_idx, best_score = blockwise_argmax(std_vectors[branch_items], cur_vectors[candidates], max_bytes)
+            pairs_scored += len(branch_items) * len(candidates)
+
+            for item, j, score in zip(branch_items, best_idx, best_score):
+                matched = j >= 0
+                similarity = float(score) if matched else 0.0
+                rows[item] = {
+                    "level": level,
+                    "standard_item": std_items[item],
+                    "standard_topic": standard_topics[s],
+                    "closest_curriculum_item": cur_items[candidates[j]] if matched else None,
+                    "curriculum_topic": curriculum_topics[cur_parent[candidates[j]]] if matched else None,
+                    "similarity": round(similarity, 2),
+                    "status": alignment_status(similarity, *thresholds),
+                }
+
+        # Exact title matches are kept even when they sit in an unmatched branch
+        exact_lookup = {}
+        for j, text in enumerate(cur_items):
+            exact_lookup.setdefault(normalize_topic(text), j)
+        for item, text in enumerate(std_items):
+            j = exact_lookup.get(normalize_topic(text))
+            if j is not None and (rows[item] is None or rows[item]["similarity"] < 1.0):
+                rows[item] = {
+                    "level": level,
+                    "standard_item": text,
+                    "standard_topic": standard_topics[std_parent[item]] if std_parent[item] >= 0 else None,
+                    "closest_curriculum_item": cur_items[j],
+                    "curriculum_topic": curriculum_topics[cur_parent[j]] if cur_parent[j] >= 0 else None,
+                    "similarity": 1.0,
+                    "status": alignment_status(1.0, *thresholds),
+                }
+
+        # Items without any standard topic to hang off are reported as unmatched
+        for item, row in enumerate(rows):
+            if row is None:
+                rows[item] = {
+                    "level": level,
+                    "standard_item": std_items[item],
+                    "standard_topic": None,
+                    "closest_curriculum_item": None,
+                    "curriculum_topic": None,
+                    "similarity": 0.0,
+                    "status": "Missing",
+                }
+
+        levels[level] = rows
+        stats["levels"][level] = {
+            "standard_items": len(std_items),
+            "curriculum_items": len(cur_items),
+            "pairs_scored": pairs_scored,
+            "full_matrix_pairs": len(std_items) * len(cur_items),
+        }
+
+    return {"levels": levels, "stats": stats}
+
+
+def summarize_levels(levels):
+    """Per-level status counts for the report."""
+    summary = {}
+    for level, rows in levels.items():
+        counts = {"Fully aligned": 0, "Partial match": 0, "Missing": 0}
+        for row in rows:
+            counts[row["status"]] += 1
+        summary[level] = {"total": len(rows), **counts}
+    return summary
@@ -7,6 +7,7 @@ from src.report_generator import save_json_report
 from src.pdf_report import generate_pdf_report
 #from src.enhanced_pdf_report import enhanced_pdf_report
 from src.styled_pdf_report import create_report
+from src.config import configure_gemini
 
 
 
@@ -17,11 +18,8 @@ def run(curriculum_path, standards_path):
     standards_text = extract_text(standards_path)
 
     print("🤖 Structuring content with Gemini...")
-    structured_curriculum_raw = structure_content(curriculum_text, "results/structured_curriculum.json")
-    structured_curriculum = json.loads(structured_curriculum_raw)
-
-    structured_standards_raw = structure_content(standards_text, "results/structured_standards.json")
-    structured_standards = json.loads(structured_standards_raw)
+    structured_curriculum = structure_content(curriculum_text, "results/structured_curriculum.json")
+    structured_standards = structure_content(standards_text, "results/structured_standards.json")
 
 
     print("📌 Running similarity & alignment...")
@@ -45,4 +43,5 @@ def run(curriculum_path, standards_path):
 
 
 if __name__ == "__main__":
+    configure_gemini()
     run("data/curriculum.pdf", "data/standards.pdf")
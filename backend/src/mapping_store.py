@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+
+# Mapping rows are stored as compact line-delimited JSON ("<base>.jsonl") plus a
+# fixed-width index ("<base>.idx.npy") holding each row's byte offset, length,
+# similarity and status code. Filtering and paging only touch the memory-mapped
+# index; record bytes are read for the selected page alone.
+
+STATUSES = ("Fully aligned", "Partial match", "Missing")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+UNKNOWN_STATUS = 255
+
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("similarity", "<f4"),
+    ("status", "u1"),
+])
+
+
+def records_path(base_path):
+    return f"{base_path}.jsonl"
+
+
+def index_path(base_path):
+    return f"{base_path}.idx.npy"
+
+
+def mapping_exists(base_path):
+    return os.path.exists(records_path(base_path)) and os.path.exists(index_path(base_path))
+
+
+def write_mapping(mapping, base_path):
+    """Write mapping rows in the compact record + index format. Returns the records path."""
+    index = np.zeros(len(mapping), dtype=INDEX_DTYPE)
+    tmp_records = records_path(base_path) + ".tmp"
+
+    offset = 0
+    with open(tmp_records, "wb") as f:
+        for i, row in enumerate(mapping):
+            line = json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            index[i] = (
+                offset,
+                len(line),
+                float(row.get("similarity", 0.0)),
+                STATUS_CODES.get(row.get("status"), UNKNOWN_STATUS),
+            )
+            offset += len(line)
+
+    tmp_index = index_path(base_path) + ".tmp.npy"
+    np.save(tmp_index, index)
+
+    # Records first so a reader never sees an index pointing past the data
+    os.replace(tmp_records, records_path(base_path))
+    os.replace(tmp_index, index_path(base_path))
+    return records_path(base_path)
+
+
+def load_index(base_path):
+    return np.load(index_path(base_path), mmap_mode="r")
+
+
+def select_rows(index, statuses=None, min_similarity=None, max_similarity=None):
+    """Row numbers matching the filters, computed on the index only."""
+    mask = np.ones(len(index), dtype=bool)
+    if statuses:
+        codes = [STATUS_CODES[s] for s in statuses]
+        mask &= np.isin(index["status"], codes)
+    if min_similarity is not None:
+        mask &= index["similarity"] >= np.float32(min_similarity)
+    if max_similarity is not None:
+        mask &= index["similarity"] <= np.float32(max_similarity)
+    return np.flatnonzero(mask)
+
+
+def read_rows(base_path, index, rows):
+    """Read the given row numbers from the records file, in order."""
+    items = []
+    with open(records_path(base_path), "rb") as f:
+        for row in rows:
+            f.seek(int(index["offset"][row]))
+            items.append(json.loads(f.read(int(index["length"][row]))))
+    return items
+
+
+def query_mapping(base_path, offset=0, limit=None, statuses=None,
+                  min_similarity=None, max_similarity=None):
+    """Return (total_matching, page_of_rows) without loading the whole mapping."""
+    index = load_index(base_path)
+    rows = select_rows(index, statuses, min_similarity, max_similarity)
+    end = len(rows) if limit is None else offset + limit
+    return len(rows), read_rows(base_path, index, rows[offset:end])
+
+
+def read_mapping(base_path):
+    """Load every mapping row (used for the unpaginated response and report building)."""
+    with open(records_path(base_path), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
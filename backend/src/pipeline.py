@@ -0,0 +1,228 @@
+import json
+import os
+from datetime import datetime
+
+from . import config, mapping_store, score_store
+from .cancellation import run_in_process
+from .config import STAGE_TIMEOUTS
+from .extract import extract_text
+from .gap_analysis import build_gaps, summarize_alignment
+from .hierarchical_matcher import compute_hierarchical_matches, summarize_levels
+from .recommendations import generate_recommendations
+from .similarity_engine import (classify_scores, get_embedding_backend, similarity_scores, EmbeddingPrefetcher,
+                                LexicalCoverage)
+from .structure_ai import structure_content
+from .styled_pdf_report import create_report
+from .topic_dedup import annotate_mapping, dedup_structure, redundancy_warnings, topic_signature
+
+# The analysis shared by the API and the batch CLI. Callers decide where
+# artifacts go (`out(suffix)` -> path), how a stage runs (`stage(name)` -> context
+# manager, e.g. with a deadline or a shared model slot), how progress is
+# reported (`progress(percent, message)`) and may override the matching
+# `settings` below, e.g. from an app's config.
+
+# Stages that call Gemini
+MODEL_STAGES = ("structuring", "similarity", "recommendations")
+
+# Settings an analysis reads from `settings`, defaulting to src.config
+ANALYSIS_SETTINGS = ("EMBEDDING_BACKEND", "HIERARCHICAL_MATCHING", "LEXICAL_OVERLAP_THRESHOLD",
+                     "FULL_ALIGNMENT_THRESHOLD", "PARTIAL_MATCH_THRESHOLD",
+                     "GAP_SEVERITY_HIGH_BELOW", "GAP_SEVERITY_MEDIUM_BELOW")
+
+
+def _defaults(token, stage, progress, settings):
+    stage = stage or (lambda name: token.stage(name, STAGE_TIMEOUTS[name]))
+    progress = progress or (lambda percent, message: None)
+    settings = {**{name: getattr(config, name) for name in ANALYSIS_SETTINGS}, **(settings or {})}
+    return stage, progress, settings
+
+
+def run_analysis(report_id, curriculum_path, out, token, standards_path=None, standards=None,
+                 stage=None, progress=None, extra_report=None, settings=None):
+    """Extract, structure and score a curriculum against a standards document and write its reports.
+
+    The standards are either a document at `standards_path`, or `standards`, the
+    (structure, embedding backend, topic vectors) of a registered document.
+    Returns (report paths, alignment summary).
+    """
+    stage, progress, settings = _defaults(token, stage, progress, settings)
+
+    print(f"[{report_id}] 📥 Extracting text...")
+    progress(20, "Extracting text from documents...")
+
+    # pdfplumber runs in a child process so a pathological PDF can be killed
+    with stage("extraction"):
+        curriculum_text = run_in_process(token, extract_text, curriculum_path)
+        standards_text = run_in_process(token, extract_text, standards_path) if standards is None else None
+
+    # Kept so a later revision can be diffed against this version
+    with open(out("curriculum.txt"), "w", encoding='utf-8') as f:
+        f.write(curriculum_text)
+
+    print(f"[{report_id}] 🤖 Structuring content with Gemini...")
+    progress(40, "Analyzing content structure...")
+
+    embedding_backend = get_embedding_backend(settings["EMBEDDING_BACKEND"])
+
+    with stage("structuring"):
+        # The standards go first, so it is known while the curriculum streams whether
+        # its topics will be embedded at all
+        if standards is None:
+            structured_standards = structure_content(standards_text, out("standards.json"), check=token.check)
+            standard_vectors = None
+        else:
+            # Registered standards were structured and embedded once at registration
+            structured_standards, registry_backend, standard_vectors = standards
+            with open(out("standards.json"), "w", encoding='utf-8') as f:
+                json.dump(structured_standards, f, ensure_ascii=False)
+            embedding_backend = registry_backend or embedding_backend
+
+        # Curriculum topics are sent for embedding while the structuring response still
+        # streams: once per dedup signature (the first one seen is the one kept), and
+        # only while some standard topic is not yet decided by an exact or token match,
+        # and only with a backend that can embed ahead of fitting (not the local one)
+        prefetcher = EmbeddingPrefetcher(embedding_backend)
+        coverage = LexicalCoverage(dedup_structure(structured_standards)[0]["topics"],
+                                   settings["LEXICAL_OVERLAP_THRESHOLD"])
+        seen_signatures = set()
+
+        def prefetch_topic(field, value):
+            if field != "topics" or not embedding_backend.corpus_independent \
+                    or topic_signature(value) in seen_signatures:
+                return
+            seen_signatures.add(topic_signature(value))
+            coverage.add(value)
+            if coverage.complete():
+                prefetcher.discard()
+            else:
+                prefetcher.add(value)
+
+        try:
+            structured_curriculum = structure_content(curriculum_text, out("curriculum.json"),
+                                                      on_item=prefetch_topic, check=token.check)
+        finally:
+            prefetcher.close()
+
+    print(f"[{report_id}] 📌 Running similarity & alignment...")
+    progress(60, "Computing similarity mapping...")
+
+    with stage("similarity"):
+        # Collapse near-duplicate topics so each is embedded and scored once
+        curriculum_for_matching, curriculum_groups = dedup_structure(structured_curriculum)
+        standards_for_matching, standards_groups = dedup_structure(structured_standards)
+
+        similarity_stats = {}
+        if standard_vectors is not None and len(standard_vectors) != len(standards_for_matching["topics"]):
+            embedding_backend, standard_vectors = get_embedding_backend(settings["EMBEDDING_BACKEND"]), None
+        scores = similarity_scores(curriculum_for_matching, standards_for_matching, embedding_backend,
+                                   similarity_stats, standard_vectors, check=token.check,
+                                   lexical_threshold=settings["LEXICAL_OVERLAP_THRESHOLD"])
+        similarity_stats["prefetched_texts"] = prefetcher.sent
+    print(f"[{report_id}] 📊 Similarity tiers: {similarity_stats.get('resolved', {})}")
+
+    return finalize_analysis(
+        report_id, out, token, structured_curriculum, structured_standards,
+        curriculum_for_matching, standards_for_matching, curriculum_groups, standards_groups,
+        scores, similarity_stats, stage, progress, extra_report, settings
+    )
+
+
+def finalize_analysis(report_id, out, token, structured_curriculum, structured_standards,
+                      curriculum_for_matching, standards_for_matching, curriculum_groups, standards_groups,
+                      scores, similarity_stats, stage=None, progress=None, extra_report=None, settings=None):
+    """Turn a score matrix into the stored mapping, recommendations and JSON/PDF reports.
+
+    Returns (report paths, alignment summary).
+    """
+    stage, progress, settings = _defaults(token, stage, progress, settings)
+    thresholds = (settings["FULL_ALIGNMENT_THRESHOLD"], settings["PARTIAL_MATCH_THRESHOLD"])
+
+    redundancy = (redundancy_warnings(curriculum_groups, "curriculum")
+                  + redundancy_warnings(standards_groups, "standards"))
+
+    # Keep the full score matrix so thresholds can be changed without re-running the models
+    score_store.save_score_matrix(
+        scores,
+        standards_for_matching["topics"],
+        curriculum_for_matching["topics"],
+        out("scores"),
+        standard_groups=standards_groups["topics"],
+        curriculum_groups=curriculum_groups["topics"],
+        tiers=similarity_stats.get("tiers", []),
+        standard_vectors=similarity_stats.get("standard_vectors"),
+        vectors_backend=similarity_stats.get("embedding_backend")
+    )
+
+    mapping = classify_scores(scores, standards_for_matching["topics"], curriculum_for_matching["topics"],
+                              *thresholds)
+    annotate_mapping(mapping, standards_groups["topics"], curriculum_groups["topics"])
+
+    mapping_base = out("mapping")
+    mapping_path = mapping_store.write_mapping(mapping, mapping_base)
+
+    hierarchy_summary = None
+    if settings["HIERARCHICAL_MATCHING"]:
+        print(f"[{report_id}] 🌳 Matching subtopics, competencies and outcomes...")
+        with stage("similarity"):
+            hierarchy = compute_hierarchical_matches(curriculum_for_matching, standards_for_matching,
+                                                     get_embedding_backend(settings["EMBEDDING_BACKEND"]),
+                                                     check=token.check, thresholds=thresholds)
+        for level, rows in hierarchy["levels"].items():
+            mapping_store.write_mapping(rows, f"{mapping_base}_{level}")
+        hierarchy_summary = summarize_levels(hierarchy["levels"])
+
+    print(f"[{report_id}] 🧠 Generating recommendations...")
+    progress(80, "Generating recommendations...")
+
+    # Get the FULL detailed recommendations from Gemini; entries of gaps unchanged
+    # since the previous analysis written to the same place are reused from its cache
+    cache_path = out("recommendations_cache.json")
+    recommendation_cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            recommendation_cache = json.load(f)
+    with stage("recommendations"):
+        recommendations = generate_recommendations(mapping, structured_curriculum, structured_standards,
+                                                   redundancy, check=token.check, cache=recommendation_cache)
+    with open(cache_path + ".tmp", "w", encoding='utf-8') as f:
+        json.dump(recommendation_cache, f, ensure_ascii=False)
+    os.replace(cache_path + ".tmp", cache_path)
+
+    gaps_list = build_gaps(mapping, settings["GAP_SEVERITY_HIGH_BELOW"], settings["GAP_SEVERITY_MEDIUM_BELOW"])
+    summary = summarize_alignment(mapping, gaps_list)
+
+    # Create clean final report
+    final_report = {
+        "id": report_id,
+        "mapping_results": mapping,
+        "summary": summary,
+        "gaps": gaps_list,
+        "recommendations": recommendations,  # Send FULL detailed recommendations as string
+        "redundancy": redundancy,
+        "hierarchy_summary": hierarchy_summary,
+        "similarity_stats": {k: v for k, v in similarity_stats.items() if k not in ("tiers", "standard_vectors")},
+        "strengths": [
+            "Strong foundation in programming fundamentals",
+            "Good balance of theory and practice",
+            "Regular assessment and feedback mechanisms",
+            "Structured learning progression"
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+    final_report.update(extra_report or {})
+
+    # Save JSON report
+    json_report_path = out("report.json")
+    with open(json_report_path, "w", encoding='utf-8') as f:
+        json.dump(final_report, f, ensure_ascii=False, separators=(',', ':'))
+
+    # Generate PDF report in a child process that is killed if rendering hangs
+    pdf_report_path = out("report.pdf")
+    with stage("rendering"):
+        run_in_process(token, create_report, json_report_path, pdf_report_path)
+
+    return {
+        "json": json_report_path,
+        "pdf": pdf_report_path,
+        "mapping": mapping_path
+    }, summary
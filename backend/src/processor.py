@@ -1,9 +1,10 @@
 import sys, os
-from extract import extract_text
-from structure_ai import structure_content
-from similarity_engine import compute_similarity
-from recommendations import generate_recommendations
-from styled_pdf_report import create_report
+from src.extract import extract_text
+from src.structure_ai import structure_content
+from src.similarity_engine import compute_similarity
+from src.recommendations import generate_recommendations
+from src.styled_pdf_report import create_report
+from src.config import configure_gemini
 import json
 
 
@@ -28,4 +29,6 @@ def process(curriculum_path, standards_path):
 
 
 if __name__ == "__main__":
+    # Single pair; use `python -m src.batch` for whole directories of curricula
+    configure_gemini()
     process(sys.argv[1], sys.argv[2])
@@ -1,28 +1,44 @@
+import hashlib
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from .config import GEMINI_API_KEY
-
-genai.configure(api_key=GEMINI_API_KEY)
+from .cancellation import AnalysisCancelled, StageTimeout
+from .config import (RECOMMENDATION_CONCURRENCY, RECOMMENDATION_SHARD_TOKENS, RECOMMENDATION_PROMPT_TOKEN_BUDGET,
+                     GEMINI_REQUEST_TIMEOUT_S)
 
 MODEL_NAME = "gemini-2.5-flash"
 
-def generate_recommendations(mapping_data, curriculum, standards):
-    prompt = f"""
-    You are an expert instructional designer and curriculum specialist. 
-    Generate a DETAILED, STRUCTURED curriculum gap analysis report.
-    
-    CURRICULUM-TO-STANDARDS MAPPING DATA:
-    {json.dumps(mapping_data, indent=2)[:2000]}  # Limit length to avoid token issues
-    
-    Generate a COMPREHENSIVE report with the following EXACT structure:
-    
-    ### OVERALL ANALYSIS & EXECUTIVE SUMMARY
-    [Provide 2-3 paragraphs summarizing alignment quality, major gaps, and strategic recommendations]
-    
-    ### MISSING LEARNING GOALS ANALYSIS
-    For EACH standard topic that needs improvement, analyze by Bloom's Taxonomy levels:
-    
-    1. **Topic: [Standard Topic Name]**
+# Rough characters-per-token ratio used to estimate prompt sizes before sending
+CHARS_PER_TOKEN = 4
+
+# Upper bound on gap names listed individually in the synthesis prompt
+SYNTHESIS_MAX_LISTED_GAPS = 200
+
+# Start of one numbered gap entry in a shard response
+ENTRY_PATTERN = re.compile(r"^\s*\d+\.\s*\*\*Topic:", re.MULTILINE)
+
+GAP_SECTION = "MISSING LEARNING GOALS ANALYSIS"
+SECTION_ORDER = [
+    "OVERALL ANALYSIS & EXECUTIVE SUMMARY",
+    GAP_SECTION,
+    "SUGGESTED IMPROVEMENTS",
+    "TOPIC SEQUENCING RECOMMENDATIONS",
+    "REDUNDANCY WARNINGS",
+    "IMPLEMENTATION ROADMAP",
+]
+
+GAP_PROMPT = """
+    You are an expert instructional designer and curriculum specialist.
+    Analyze the following standard topics that are NOT fully covered by a curriculum.
+
+    GAPS (JSON, one object per standard topic):
+    {gaps}
+
+    For EACH gap above, in the given order, write exactly one entry with this structure,
+    numbering entries from {start}:
+
+    {start}. **Topic: [Standard Topic Name]**
        - Status: [Fully aligned/Partial match/Missing]
        - Closest Curriculum Match: [Matched topic]
        - Similarity Score: [Score]
@@ -33,41 +49,260 @@ def generate_recommendations(mapping_data, curriculum, standards):
          * Analyze: [Missing analysis outcomes]
          * Evaluate: [Missing evaluation outcomes]
          * Create: [Missing creation outcomes]
-    
+
+    IMPORTANT RULES:
+    1. Cover every gap listed, and no others
+    2. Be specific and actionable
+    3. Output only the entries, with no headings or introduction
+    """
+
+SYNTHESIS_PROMPT = """
+    You are an expert instructional designer and curriculum specialist.
+    Write the summary sections of a curriculum gap analysis report.
+
+    ALIGNMENT OVERVIEW:
+    {overview}
+
+    NEAR-DUPLICATE TOPICS DETECTED BEFORE MATCHING (use these for REDUNDANCY WARNINGS):
+    {redundancy}
+
+    Generate the following sections with these EXACT headings:
+
+    ### OVERALL ANALYSIS & EXECUTIVE SUMMARY
+    [Provide 2-3 paragraphs summarizing alignment quality, major gaps, and strategic recommendations]
+
     ### SUGGESTED IMPROVEMENTS
     [Numbered list of 10-15 specific, actionable improvements]
     1. [Specific improvement action]
     2. [Specific improvement action]
     ...
-    
+
     ### TOPIC SEQUENCING RECOMMENDATIONS
     [Logical module ordering with rationale]
     - Prerequisite chains and dependencies
     - Cognitive progression flow
     - Recommended sequence with timeline
-    
+
     ### REDUNDANCY WARNINGS
     [Identify overlapping topics and suggest consolidation]
     - Topic: [Overlapping topic]
       - Locations: [Where it appears]
       - Consolidation Recommendation: [How to combine]
-    
+
     ### IMPLEMENTATION ROADMAP
     [Phased implementation plan]
     - Phase 1 (Immediate): [Actions for first month]
     - Phase 2 (Short-term): [Actions for 1-3 months]
     - Phase 3 (Medium-term): [Actions for 3-6 months]
-    
+
     IMPORTANT RULES:
     1. Use complete sentences and paragraphs
     2. Be specific and actionable
-    3. Reference actual topics from the mapping data
-    4. Include Bloom's Taxonomy analysis for each gap
-    5. Do NOT use bullet points for the main analysis sections
-    6. Make this comprehensive and professional
+    3. Reference actual topics from the overview
+    4. Do NOT use bullet points for the main analysis sections
+    5. Make this comprehensive and professional
     """
 
+
+class TokenBudgetExceeded(ValueError):
+    pass
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _generate(prompt, check=None):
+    if check:
+        check()
+    if estimate_tokens(prompt) > RECOMMENDATION_PROMPT_TOKEN_BUDGET:
+        raise TokenBudgetExceeded(
+            f"Prompt of ~{estimate_tokens(prompt)} tokens exceeds budget of {RECOMMENDATION_PROMPT_TOKEN_BUDGET}"
+        )
     model = genai.GenerativeModel(MODEL_NAME)
-    response = model.generate_content(prompt)
+    return model.generate_content(prompt, request_options={"timeout": GEMINI_REQUEST_TIMEOUT_S}).text.strip()
+
+
+def _gap_record(row):
+    return {
+        "standard_topic": row["standard_topic"],
+        "status": row["status"],
+        "closest_curriculum_topic": row.get("closest_curriculum_topic"),
+        "similarity": row.get("similarity"),
+    }
+
+
+def shard_gaps(gaps, max_tokens=None):
+    """Pack gap records into shards whose serialized size stays under `max_tokens`."""
+    max_tokens = max_tokens or RECOMMENDATION_SHARD_TOKENS
+    shards, current, current_tokens = [], [], 0
+    for gap in gaps:
+        tokens = estimate_tokens(json.dumps(gap, ensure_ascii=False))
+        if current and current_tokens + tokens > max_tokens:
+            shards.append(current)
+            current, current_tokens = [], 0
+        current.append(gap)
+        current_tokens += tokens
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _fallback_entry(number, gap, reason):
+    return (
+        f"{number}. **Topic: {gap['standard_topic']}**\n"
+        f"   - Status: {gap['status']}\n"
+        f"   - Closest Curriculum Match: {gap.get('closest_curriculum_topic')}\n"
+        f"   - Similarity Score: {gap.get('similarity')}\n"
+        f"   - Bloom's Taxonomy Gaps: analysis unavailable ({reason})"
+    )
+
+
+def _analyze_shard(shard, start, check=None):
+    """Bloom's-taxonomy entries for one shard; oversized shards are split, failures degrade per gap.
+
+    Returns (text, complete), where `complete` is False when any entry is a fallback.
+    """
+    prompt = GAP_PROMPT.format(gaps=json.dumps(shard, ensure_ascii=False, indent=1), start=start)
+    try:
+        return _generate(prompt, check), True
+    except TokenBudgetExceeded:
+        if len(shard) > 1:
+            half = len(shard) // 2
+            first, first_complete = _analyze_shard(shard[:half], start, check)
+            second, second_complete = _analyze_shard(shard[half:], start + half, check)
+            return first + "\n\n" + second, first_complete and second_complete
+        return _fallback_entry(start, shard[0], "gap description exceeds the token budget"), False
+    except (AnalysisCancelled, StageTimeout):
+        raise
+    except Exception as e:
+        print(f"⚠️ Recommendation shard starting at {start} failed: {e}")
+        return "\n\n".join(_fallback_entry(start + i, gap, "model call failed") for i, gap in enumerate(shard)), False
+
+
+def _gap_key(gap):
+    return json.dumps(gap, ensure_ascii=False, sort_keys=True)
+
+
+def split_entries(text):
+    """Split a shard response into its numbered gap entries."""
+    starts = [m.start() for m in ENTRY_PATTERN.finditer(text)]
+    return [text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+def _renumber(entry, number):
+    return re.sub(r"^\s*\d+\.", f"{number}.", entry, count=1)
+
+
+def _alignment_overview(mapping_data):
+    """Compact, budget-bounded description of the whole mapping for the synthesis call."""
+    counts = {}
+    for row in mapping_data:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+
+    gaps = sorted((r for r in mapping_data if r["status"] != "Fully aligned"),
+                  key=lambda r: r.get("similarity", 0))
+    aligned = [r["standard_topic"] for r in mapping_data if r["status"] == "Fully aligned"]
+
+    lines = [f"Standard topics: {len(mapping_data)}; " + ", ".join(f"{k}: {v}" for k, v in counts.items())]
+    lines.append("Weakest gaps (status, similarity, closest curriculum topic):")
+    for row in gaps[:SYNTHESIS_MAX_LISTED_GAPS]:
+        lines.append(f"- {row['standard_topic']} ({row['status']}, {row.get('similarity')}, "
+                     f"{row.get('closest_curriculum_topic')})")
+    if len(gaps) > SYNTHESIS_MAX_LISTED_GAPS:
+        lines.append(f"- ... and {len(gaps) - SYNTHESIS_MAX_LISTED_GAPS} more gaps")
+    lines.append("Fully aligned topics: " + ", ".join(aligned[:SYNTHESIS_MAX_LISTED_GAPS]))
+    return "\n".join(lines)
+
+
+def _synthesis_prompt(mapping_data, redundancy):
+    overview = _alignment_overview(mapping_data)
+    redundancy_json = json.dumps(redundancy or [], ensure_ascii=False)
+
+    # Shrink the optional context until the prompt fits the budget
+    fixed = estimate_tokens(SYNTHESIS_PROMPT)
+    room = max(0, RECOMMENDATION_PROMPT_TOKEN_BUDGET - fixed) * CHARS_PER_TOKEN
+    redundancy_json = redundancy_json[:room // 4]
+    overview = overview[:room - len(redundancy_json)]
+
+    return SYNTHESIS_PROMPT.format(overview=overview, redundancy=redundancy_json)
+
+
+def _synthesize(prompt, cached, check=None):
+    return cached if cached is not None else _generate(prompt, check)
+
+
+def split_sections(text):
+    """Map '### HEADING' -> body for a markdown report."""
+    sections = {}
+    for match in re.finditer(r"^###\s*(.+?)\s*$([\s\S]*?)(?=^###\s|\Z)", text, re.MULTILINE):
+        sections[match.group(1).strip().upper()] = match.group(2).strip()
+    return sections
+
+
+def generate_recommendations(mapping_data, curriculum, standards, redundancy=None, check=None, cache=None):
+    """Gap analysis report built map-reduce style.
+
+    Every non-aligned standard topic gets its Bloom's-taxonomy entry from one of
+    several concurrent, size-bounded shard calls; one short synthesis call,
+    running alongside them, writes the summary, improvement, sequencing,
+    redundancy and roadmap sections. No gap is truncated away: shards that fail
+    or exceed the token budget fall back to per-gap placeholder entries.
+    `check()` is called before every model call and may raise to abort.
+
+    `cache` (a dict, updated in place) holds the entry of every gap record and
+    the synthesis of the last run, e.g. of the previous version of a revised
+    curriculum: gaps whose record is unchanged, and an unchanged synthesis
+    prompt, are not sent to the model again.
+    """
+    cache = {} if cache is None else cache
+    known = cache.get("gaps", {})
+    gaps = [_gap_record(row) for row in mapping_data if row["status"] != "Fully aligned"]
+    entries = {key: known[key] for key in map(_gap_key, gaps) if key in known}
+    missing = [gap for gap in gaps if _gap_key(gap) not in entries]
+
+    shards = shard_gaps(missing)
+    starts = [1]
+    for shard in shards[:-1]:
+        starts.append(starts[-1] + len(shard))
+
+    synthesis_prompt = _synthesis_prompt(mapping_data, redundancy)
+    synthesis_key = hashlib.sha256(synthesis_prompt.encode("utf-8")).hexdigest()
+    cached_synthesis = (cache.get("synthesis") or {}).get(synthesis_key)
+
+    with ThreadPoolExecutor(max_workers=RECOMMENDATION_CONCURRENCY) as pool:
+        synthesis_future = pool.submit(_synthesize, synthesis_prompt, cached_synthesis, check)
+        shard_futures = [pool.submit(_analyze_shard, shard, start, check) for shard, start in zip(shards, starts)]
+        shard_results = [future.result() for future in shard_futures]
+        synthesis = synthesis_future.result()
+
+    # Entries of shards the model answered in the requested format are kept per gap;
+    # anything else is used as is, in place of its first gap
+    unsplit = {}
+    for shard, (text, complete) in zip(shards, shard_results):
+        shard_entries = split_entries(text)
+        if complete and len(shard_entries) == len(shard):
+            entries.update(zip(map(_gap_key, shard), shard_entries))
+        else:
+            unsplit[_gap_key(shard[0])] = text
+
+    gap_entries = []
+    for gap in gaps:
+        key = _gap_key(gap)
+        if key in entries:
+            gap_entries.append(_renumber(entries[key], len(gap_entries) + 1))
+        elif key in unsplit:
+            gap_entries.append(unsplit[key])
+
+    cache["gaps"] = {key: entries[key] for key in map(_gap_key, gaps) if key in entries}
+    cache["synthesis"] = {synthesis_key: synthesis}
+
+    sections = split_sections(synthesis)
+    sections[GAP_SECTION] = "\n\n".join(gap_entries) if gap_entries else \
+        "All standard topics are fully aligned with the curriculum."
+
+    if not all(name in sections for name in SECTION_ORDER):
+        # Keep whatever the model wrote when it ignored the requested headings
+        return f"### {GAP_SECTION}\n\n{sections[GAP_SECTION]}\n\n{synthesis}"
 
-    return response.text
\ No newline at end of file
+    return "\n\n".join(f"### {name}\n\n{sections[name]}" for name in SECTION_ORDER)
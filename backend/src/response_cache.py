@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # listed in requirements.txt; without it only gzip is served
+    brotli = None
+
+
+class CachedBody:
+    """A pre-serialized JSON body with its compressed variants and ETag."""
+
+    __slots__ = ("validator", "etag", "identity", "gzip", "br")
+
+    def __init__(self, validator, body):
+        self.validator = validator
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.identity = body
+        # A fixed mtime keeps the bytes identical across workers and cache rebuilds,
+        # as the strong "-gzip" ETag promises
+        self.gzip = gzip.compress(body, compresslevel=6, mtime=0)
+        self.br = brotli.compress(body) if brotli else None
+
+    def variants(self):
+        """ETags of every representation this entry can serve."""
+        tags = [self.etag, f"{self.etag}-gzip"]
+        if self.br is not None:
+            tags.append(f"{self.etag}-br")
+        return tags
+
+    def select(self, accepts):
+        """Pick the smallest encoding the client accepts: (body, encoding, etag)."""
+        if self.br is not None and accepts("br"):
+            return self.br, "br", f"{self.etag}-br"
+        if accepts("gzip"):
+            return self.gzip, "gzip", f"{self.etag}-gzip"
+        return self.identity, None, self.etag
+
+
+class ResponseCache:
+    """Bounded LRU of JSON response bodies, keyed by file path.
+
+    Entries are validated against the file's mtime and size on every lookup,
+    so a rewritten report is picked up without explicit invalidation.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, loader=None):
+        stat = os.stat(path)
+        validator = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.validator == validator:
+                self._entries.move_to_end(path)
+                return entry
+
+        payload = loader(path) if loader else _load_json(path)
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entry = CachedBody(validator, body)
+
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
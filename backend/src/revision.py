@@ -0,0 +1,202 @@
+import hashlib
+import re
+import numpy as np
+from .similarity_engine import (normalize_topic, score_matrix, similarity_scores, get_embedding_backend,
+                                LocalEmbeddingBackend)
+from .topic_dedup import STRUCTURE_FIELDS
+
+# Lines that open a new section of a syllabus: "Unit 3", "Module II:", "Chapter 4 -",
+# "2.", "2.1 Linear Models", or short ALL-CAPS headings
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:(?i:unit|module|chapter|section|week|part|lecture|topic)\s*[-:.]?\s*(?:\d+|[IVXLCivxlc]+)\b"
+    r"|\d+(?:\.\d+)*[.)]?\s+\S"
+    r"|[A-Z][A-Z0-9 &,/()-]{3,60}$)"
+)
+
+# Share of an item's words that must appear in a section to attribute it there
+ATTRIBUTION_MIN_CONTAINMENT = 0.6
+
+
+def split_sections(text):
+    """Split extracted text into sections at heading-like lines (falls back to paragraphs)."""
+    sections, current = [], []
+    for line in text.splitlines():
+        if HEADING_PATTERN.match(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append("\n".join(current).strip())
+
+    if len(sections) <= 1:
+        sections = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    return sections
+
+
+def section_key(section):
+    return hashlib.sha1(" ".join(section.split()).lower().encode("utf-8")).hexdigest()
+
+
+def diff_sections(old_sections, new_sections):
+    """Classify sections by content hash: (unchanged old indices, changed/new sections, removed old indices)."""
+    old_keys = [section_key(s) for s in old_sections]
+    new_keys = {section_key(s) for s in new_sections}
+
+    unchanged = [i for i, key in enumerate(old_keys) if key in new_keys]
+    removed = [i for i, key in enumerate(old_keys) if key not in new_keys]
+    changed = [s for s in new_sections if section_key(s) not in set(old_keys)]
+    return unchanged, changed, removed
+
+
+def attribute_item(item, normalized_sections):
+    """Indices of the sections an extracted item came from (empty when it cannot be placed)."""
+    needle = normalize_topic(item)
+    if not needle:
+        return set()
+    exact = {i for i, section in enumerate(normalized_sections) if needle in section}
+    if exact:
+        return exact
+
+    # Paraphrased items go to the section containing most of their words
+    words = set(needle.split())
+    best, best_share = None, 0.0
+    for i, section in enumerate(normalized_sections):
+        share = len(words & set(section.split())) / len(words)
+        if share > best_share:
+            best, best_share = i, share
+    return {best} if best is not None and best_share >= ATTRIBUTION_MIN_CONTAINMENT else set()
+
+
+def revise_structure(previous, old_text, new_text, structure_fn):
+    """Re-structure only the sections of `new_text` that differ from `old_text`.
+
+    Items of `previous` attributed to unchanged sections (or to no section at
+    all) are kept; items that only came from changed or removed sections are
+    dropped and replaced by whatever `structure_fn` extracts from the changed
+    sections. Returns (revised structure, diff summary).
+    """
+    old_sections = split_sections(old_text)
+    new_sections = split_sections(new_text)
+    unchanged, changed, removed = diff_sections(old_sections, new_sections)
+
+    summary = {
+        "sections_before": len(old_sections),
+        "sections_after": len(new_sections),
+        "unchanged": len(unchanged),
+        "changed_or_added": len(changed),
+        "removed": len(removed),
+    }
+    if not changed and not removed:
+        return previous, summary
+
+    normalized_sections = [normalize_topic(s) for s in old_sections]
+    kept_sections = set(unchanged)
+
+    revised = dict(previous)
+    for field in STRUCTURE_FIELDS:
+        kept = []
+        for item in previous.get(field) or []:
+            sources = attribute_item(item, normalized_sections)
+            if not sources or sources & kept_sections:
+                kept.append(item)
+        revised[field] = kept
+
+    if changed:
+        delta = structure_fn("\n\n".join(changed))
+        for field in STRUCTURE_FIELDS:
+            revised[field] = list(dict.fromkeys(revised[field] + list(delta.get(field) or [])))
+        revised["subject"] = previous.get("subject") or delta.get("subject", "")
+
+    return revised, summary
+
+
+def update_scores(old_scores, labels, standard_topics, curriculum_topics, backend=None, check=None,
+                  standard_vectors=None, lexical_threshold=None):
+    """Rebuild the score matrix for a revised curriculum, scoring only what changed.
+
+    Columns of curriculum topics that survived the revision are copied from the
+    stored matrix and only new topics are scored. Standard topics are embedded
+    only where `standard_vectors` (stored with the matrix) lack them. Rows
+    decided lexically hold token-overlap rather than cosine scores, so rows that
+    are, or through a new topic become, lexical are rescored in full; that keeps
+    every row on one scale and costs no embeddings unless their lexical match was
+    removed. The local backend is always rescored in full. `check()` and
+    `lexical_threshold` are passed on to the scoring; `check()` may raise to abort.
+
+    Returns (scores, similarity stats with tiers and standard vectors, update summary).
+    """
+    backend = backend or get_embedding_backend()
+    if isinstance(backend, LocalEmbeddingBackend):
+        # Local embeddings are fit per corpus, so scores from different fits do not
+        # mix; rescoring everything locally is sub-second anyway
+        stats = {}
+        scores = similarity_scores({"topics": curriculum_topics}, {"topics": standard_topics}, backend, stats,
+                                   check=check, lexical_threshold=lexical_threshold)
+        return scores, stats, {
+            "columns_reused": 0,
+            "columns_scored": len(curriculum_topics),
+            "columns_removed": len(labels["curriculum_topics"]),
+            "rows_rescored": len(standard_topics),
+        }
+
+    if labels.get("vectors_backend") != backend.name:
+        standard_vectors = None
+    vectors = standard_vectors
+
+    old_columns = {topic: j for j, topic in enumerate(labels["curriculum_topics"])}
+    old_tiers = labels.get("tiers") or ["embedding"] * len(standard_topics)
+
+    scores = np.zeros((len(standard_topics), len(curriculum_topics)), dtype=np.float32)
+    kept = [(j, old_columns[t]) for j, t in enumerate(curriculum_topics) if t in old_columns]
+    added = [j for j, t in enumerate(curriculum_topics) if t not in old_columns]
+
+    if kept:
+        new_idx, old_idx = zip(*kept)
+        scores[:, list(new_idx)] = np.asarray(old_scores)[:, list(old_idx)]
+
+    tiers = list(old_tiers)
+    lexical = [i for i, tier in enumerate(old_tiers) if tier != "embedding"]
+    embedding_rows = [i for i, tier in enumerate(old_tiers) if tier == "embedding"]
+    became_lexical = []
+    if added and embedding_rows:
+        added_stats = {}
+        row_vectors = None if vectors is None else np.asarray(vectors)[embedding_rows]
+        scores[np.ix_(embedding_rows, added)] = score_matrix(
+            [standard_topics[i] for i in embedding_rows], [curriculum_topics[j] for j in added], backend, added_stats,
+            row_vectors, check, lexical_threshold
+        )
+        became_lexical = [i for i, tier in zip(embedding_rows, added_stats["tiers"]) if tier != "embedding"]
+        vectors = _merge_vectors(vectors, len(standard_topics), embedding_rows, added_stats.get("standard_vectors"))
+
+    rescored = sorted(lexical + became_lexical)
+    if rescored and curriculum_topics:
+        row_stats = {}
+        row_vectors = None if vectors is None else np.asarray(vectors)[rescored]
+        scores[rescored] = score_matrix([standard_topics[i] for i in rescored], curriculum_topics, backend, row_stats,
+                                        row_vectors, check, lexical_threshold)
+        for i, tier in zip(rescored, row_stats["tiers"]):
+            tiers[i] = tier
+        vectors = _merge_vectors(vectors, len(standard_topics), rescored, row_stats.get("standard_vectors"))
+
+    similarity_stats = {"tiers": tiers}
+    if vectors is not None:
+        similarity_stats.update(standard_vectors=vectors, embedding_backend=backend.name)
+    return scores, similarity_stats, {
+        "columns_reused": len(kept),
+        "columns_scored": len(added),
+        "columns_removed": len(old_columns) - len(kept),
+        "rows_rescored": len(rescored),
+    }
+
+
+def _merge_vectors(vectors, n_rows, rows, new_vectors):
+    """Copy the embedded (non-NaN) rows of `new_vectors` into `vectors` (n_rows long) at `rows`."""
+    if new_vectors is None:
+        return vectors
+    rows = list(rows)
+    if vectors is None:
+        vectors = np.full((n_rows, new_vectors.shape[1]), np.nan, dtype=np.float32)
+    merged = np.array(vectors, dtype=np.float32)
+    embedded = ~np.isnan(new_vectors).any(axis=1)
+    merged[np.asarray(rows)[embedded]] = new_vectors[embedded]
+    return merged
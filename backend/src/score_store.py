@@ -0,0 +1,64 @@
+import json
+import os
+import numpy as np
+
+# A session's standards x curriculum score matrix is kept as "<base>.npy"
+# (float32) next to "<base>.json", which holds the row/column labels and any
+# metadata needed to rebuild mapping rows from the matrix alone. Embeddings of
+# the standard topics, when the backend's vectors can be reused later, go to
+# "<base>_vectors.npy" so a revision does not have to embed them again.
+
+
+def matrix_path(base_path):
+    return f"{base_path}.npy"
+
+
+def labels_path(base_path):
+    return f"{base_path}.json"
+
+
+def vectors_path(base_path):
+    return f"{base_path}_vectors.npy"
+
+
+def score_matrix_exists(base_path):
+    return os.path.exists(matrix_path(base_path)) and os.path.exists(labels_path(base_path))
+
+
+def save_score_matrix(scores, standard_topics, curriculum_topics, base_path, standard_vectors=None,
+                      vectors_backend=None, **metadata):
+    """Store the matrix and its labels; `standard_vectors` (NaN rows for topics never
+    embedded) are stored with the name of the backend that produced them."""
+    labels = {
+        "standard_topics": list(standard_topics),
+        "curriculum_topics": list(curriculum_topics),
+        **metadata,
+    }
+    if standard_vectors is not None:
+        labels["vectors_backend"] = vectors_backend
+        tmp_vectors = vectors_path(base_path) + ".tmp.npy"
+        np.save(tmp_vectors, np.asarray(standard_vectors, dtype=np.float32))
+        os.replace(tmp_vectors, vectors_path(base_path))
+    tmp_matrix = matrix_path(base_path) + ".tmp.npy"
+    np.save(tmp_matrix, np.asarray(scores, dtype=np.float32))
+    with open(labels_path(base_path) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(labels, f, ensure_ascii=False, separators=(",", ":"))
+
+    os.replace(tmp_matrix, matrix_path(base_path))
+    os.replace(labels_path(base_path) + ".tmp", labels_path(base_path))
+    return matrix_path(base_path)
+
+
+def load_score_matrix(base_path):
+    """Return (memory-mapped scores, labels dict)."""
+    with open(labels_path(base_path), "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    return np.load(matrix_path(base_path), mmap_mode="r"), labels
+
+
+def load_standard_vectors(base_path):
+    """Stored standard-topic embeddings (see `labels["vectors_backend"]`), or None."""
+    try:
+        return np.load(vectors_path(base_path))
+    except FileNotFoundError:
+        return None
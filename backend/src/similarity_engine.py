@@ -1,47 +1,405 @@
-import json
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import Normalizer
+import joblib
 import google.generativeai as genai
-from .config import GEMINI_API_KEY
+from .config import (EMBEDDING_BACKEND, LOCAL_EMBEDDING_DIM, LOCAL_FIT_CACHE_MAX,
+                     LEXICAL_OVERLAP_THRESHOLD, FULL_ALIGNMENT_THRESHOLD, PARTIAL_MATCH_THRESHOLD,
+                     GEMINI_REQUEST_TIMEOUT_S)
 
-genai.configure(api_key=GEMINI_API_KEY)
 
 # Updated working model
 EMBED_MODEL = "models/text-embedding-004"
 
+# The embedding API accepts at most this many texts per batch request
+EMBED_BATCH_SIZE = 100
+
+# Remote embeddings kept in memory per process, so prefetched texts are not re-sent
+EMBED_CACHE_MAX_ENTRIES = 50000
+
 
 def embed(sentence):
-    response = genai.embed_content(model=EMBED_MODEL, content=sentence)
+    response = genai.embed_content(model=EMBED_MODEL, content=sentence,
+                                   request_options={"timeout": GEMINI_REQUEST_TIMEOUT_S})
     return np.array(response["embedding"])
 
 
-def compute_similarity(curriculum_data, standard_data):
+class EmbeddingBackend:
+    """Turns texts into embedding vectors.
+
+    `fit` is called once with the whole corpus of a comparison before any
+    `embed_many` call; backends that need no training simply ignore it.
+    `check()`, when given, is called between remote requests and may raise to abort.
+    Vectors of a `corpus_independent` backend can be stored and compared with
+    vectors embedded later; those of other backends only within one fit.
+    """
+
+    name = None
+    corpus_independent = True
+
+    def fit(self, corpus):
+        return self
+
+    def embed_many(self, texts, check=None):
+        raise NotImplementedError
+
+    def prefetch(self, texts, check=None):
+        """Warm any cache ahead of a later `embed_many` call; a no-op by default."""
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """Remote embeddings from the Gemini embedding model."""
+
+    name = "gemini"
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def _cached(self, texts):
+        with self._cache_lock:
+            return {t: self._cache[t] for t in texts if t in self._cache}
+
+    def _remember(self, texts, vectors):
+        with self._cache_lock:
+            for text, vector in zip(texts, vectors):
+                self._cache[text] = vector
+                self._cache.move_to_end(text)
+            while len(self._cache) > EMBED_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def prefetch(self, texts, check=None):
+        cached = self._cached(texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in cached))
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            if check:
+                check()
+            batch = missing[start:start + EMBED_BATCH_SIZE]
+            response = genai.embed_content(model=EMBED_MODEL, content=batch,
+                                           request_options={"timeout": GEMINI_REQUEST_TIMEOUT_S})
+            self._remember(batch, np.array(response["embedding"], dtype=np.float32))
+
+    def embed_many(self, texts, check=None):
+        texts = list(texts)
+        self.prefetch(texts, check)
+        cached = self._cached(texts)
+        if len(cached) < len(set(texts)):
+            if check:
+                check()
+            # Evicted between prefetch and lookup under heavy load; embed the rest directly
+            rest = [t for t in dict.fromkeys(texts) if t not in cached]
+            response = genai.embed_content(model=EMBED_MODEL, content=rest,
+                                           request_options={"timeout": GEMINI_REQUEST_TIMEOUT_S})
+            cached.update(zip(rest, np.array(response["embedding"], dtype=np.float32)))
+        return np.array([cached[t] for t in texts], dtype=np.float32)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """Offline embeddings: TF-IDF over character n-grams reduced with truncated SVD.
+
+    The pipeline is fit on the corpus of each comparison. With `fit_cache_dir`
+    (set for registered standards, whose side of the corpus never changes) fits
+    are kept there by corpus, up to LOCAL_FIT_CACHE_MAX most recently used.
+    """
+
+    name = "local"
+    corpus_independent = False
+
+    def __init__(self, n_components=LOCAL_EMBEDDING_DIM, fit_cache_dir=None):
+        self.n_components = n_components
+        self.fit_cache_dir = fit_cache_dir
+        self.pipeline = None
+
+    def fit_path(self, corpus):
+        digest = hashlib.sha256("\n".join(corpus).encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.fit_cache_dir, f"local_{self.n_components}_{digest}.joblib")
+
+    def fit(self, corpus):
+        corpus = list(corpus)
+        if self.fit_cache_dir:
+            path = self.fit_path(corpus)
+            try:
+                self.pipeline = joblib.load(path)
+                os.utime(path)  # recency for pruning
+                return self
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable local fit {path}: {e}")
+
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)
+        features = vectorizer.fit_transform(corpus)
+
+        # SVD needs fewer components than features; tiny corpora skip it
+        n_components = min(self.n_components, features.shape[0], features.shape[1] - 1)
+        if n_components >= 2:
+            self.pipeline = make_pipeline(vectorizer, TruncatedSVD(n_components, random_state=0), Normalizer(copy=False))
+            self.pipeline.fit(corpus)
+        else:
+            self.pipeline = make_pipeline(vectorizer, Normalizer(copy=False))
+
+        if self.fit_cache_dir:
+            self._store_fit(path)
+        return self
+
+    def _store_fit(self, path):
+        os.makedirs(self.fit_cache_dir, exist_ok=True)
+        # Written aside and renamed, so a concurrent load never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(self.pipeline, tmp_path)
+        os.replace(tmp_path, path)
+
+        fits = sorted((entry for entry in os.scandir(self.fit_cache_dir) if entry.name.endswith(".joblib")),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in fits[LOCAL_FIT_CACHE_MAX:]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def embed_many(self, texts, check=None):
+        if self.pipeline is None:
+            raise RuntimeError("LocalEmbeddingBackend.fit() must be called before embed_many()")
+        vectors = self.pipeline.transform(list(texts))
+        if hasattr(vectors, "toarray"):
+            vectors = vectors.toarray()
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class EmbeddingPrefetcher:
+    """Sends texts to `backend.prefetch` in small background batches as they become known,
+    e.g. while a structuring response is still streaming."""
+
+    def __init__(self, backend, batch_size=16):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.sent = 0
+        self._pending = []
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._futures = []
+
+    def add(self, text):
+        self._pending.append(text)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.sent += len(self._pending)
+            self._futures.append(self._pool.submit(self.backend.prefetch, self._pending))
+            self._pending = []
+
+    def discard(self):
+        """Drop texts not sent yet, e.g. once it is clear they will not be embedded."""
+        self._pending = []
+
+    def close(self):
+        """Flush and wait; prefetch failures are ignored since embed_many retries anyway."""
+        self.flush()
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"⚠️ Embedding prefetch failed: {e}")
+        self._pool.shutdown()
+
+
+EMBEDDING_BACKENDS = {
+    GeminiEmbeddingBackend.name: GeminiEmbeddingBackend,
+    LocalEmbeddingBackend.name: LocalEmbeddingBackend,
+}
 
+
+def get_embedding_backend(name=None):
+    name = name or EMBEDDING_BACKEND
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose one of: {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[name]()
+
+
+def alignment_status(score, full_threshold=None, partial_threshold=None):
+    full_threshold = FULL_ALIGNMENT_THRESHOLD if full_threshold is None else full_threshold
+    partial_threshold = PARTIAL_MATCH_THRESHOLD if partial_threshold is None else partial_threshold
+    return ("Fully aligned" if score >= full_threshold
+            else "Partial match" if score >= partial_threshold
+            else "Missing")
+
+
+def normalize_topic(text):
+    """Lowercase and collapse punctuation/whitespace so trivially different titles compare equal."""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def token_jaccard(standard_topics, curriculum_topics):
+    """Vectorized token-set Jaccard between every standard and curriculum topic."""
+    vectorizer = CountVectorizer(binary=True, token_pattern=r"(?u)\b\w+\b", dtype=np.float32)
+    try:
+        vectorizer.fit(standard_topics + curriculum_topics)
+    except ValueError:  # no tokens at all
+        return np.zeros((len(standard_topics), len(curriculum_topics)), dtype=np.float32)
+
+    std_tokens = vectorizer.transform(standard_topics)
+    cur_tokens = vectorizer.transform(curriculum_topics)
+    intersection = (std_tokens @ cur_tokens.T).toarray()
+    union = (np.asarray(std_tokens.sum(axis=1)) + np.asarray(cur_tokens.sum(axis=1)).T) - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _tokens(text):
+    # Same tokens as token_jaccard's CountVectorizer
+    return set(re.findall(r"(?u)\b\w+\b", text.lower()))
+
+
+class LexicalCoverage:
+    """Tracks which standard topics the lexical tiers of `score_matrix` already decide
+    as curriculum topics arrive one by one; once all are, nothing will be embedded."""
+
+    def __init__(self, standard_topics, lexical_threshold=None):
+        self._threshold = LEXICAL_OVERLAP_THRESHOLD if lexical_threshold is None else lexical_threshold
+        self._undecided = [(normalize_topic(t), _tokens(t)) for t in standard_topics]
+
+    def add(self, curriculum_topic):
+        normalized, tokens = normalize_topic(curriculum_topic), _tokens(curriculum_topic)
+        self._undecided = [
+            (n, t) for n, t in self._undecided
+            if n != normalized and not (t | tokens and len(t & tokens) >= self._threshold * len(t | tokens))
+        ]
+
+    def complete(self):
+        return not self._undecided
+
+
+def score_matrix(standard_topics, curriculum_topics, backend=None, stats=None, standard_vectors=None, check=None,
+                 lexical_threshold=None):
+    """Score every standard topic against every curriculum topic with a lexical-first cascade.
+
+    Tier 1 decides normalized exact matches (score 1.0), tier 2 decides rows whose
+    best token-set Jaccard reaches `lexical_threshold` (LEXICAL_OVERLAP_THRESHOLD
+    by default; score = Jaccard), and only the remaining ambiguous standard
+    topics are embedded. Returns the
+    (standards x curriculum) score matrix and fills `stats` with per-tier counts.
+
+    `standard_vectors` are precomputed embeddings of `standard_topics` (row for
+    row) from an already fitted `backend`; only curriculum topics, and standard
+    topics whose row is NaN, are embedded then. With a corpus-independent
+    backend `stats["standard_vectors"]` returns them, NaN for rows not embedded.
+    `check()` is called before and during embedding and may raise to abort.
+    """
+    lexical_threshold = LEXICAL_OVERLAP_THRESHOLD if lexical_threshold is None else lexical_threshold
+    scores = token_jaccard(standard_topics, curriculum_topics)
+
+    normalized_curriculum = {}
+    for j, topic in enumerate(curriculum_topics):
+        normalized_curriculum.setdefault(normalize_topic(topic), []).append(j)
+
+    tiers = []
+    for i, topic in enumerate(standard_topics):
+        exact = normalized_curriculum.get(normalize_topic(topic))
+        if exact:
+            scores[i, exact] = 1.0
+            tiers.append("exact")
+        elif scores[i].max() >= lexical_threshold:
+            tiers.append("token_overlap")
+        else:
+            tiers.append("embedding")
+
+    ambiguous = [i for i, tier in enumerate(tiers) if tier == "embedding"]
+    embedded_standards = 0
+    all_vectors = None
+    if ambiguous:
+        if check:
+            check()
+        backend = backend or get_embedding_backend()
+        ambiguous_topics = [standard_topics[i] for i in ambiguous]
+        if standard_vectors is None:
+            backend.fit(ambiguous_topics + curriculum_topics)
+            ambiguous_vectors = backend.embed_many(ambiguous_topics, check)
+            embedded_standards = len(ambiguous)
+        else:
+            ambiguous_vectors = np.array(standard_vectors, dtype=np.float32)[ambiguous]
+            missing = [k for k, row in enumerate(ambiguous_vectors) if np.isnan(row).any()]
+            if missing:
+                ambiguous_vectors[missing] = backend.embed_many([ambiguous_topics[k] for k in missing], check)
+            embedded_standards = len(missing)
+        scores[ambiguous] = cosine_similarity(ambiguous_vectors, backend.embed_many(curriculum_topics, check))
+
+        if backend.corpus_independent:
+            all_vectors = (np.array(standard_vectors, dtype=np.float32) if standard_vectors is not None
+                           else np.full((len(standard_topics), ambiguous_vectors.shape[1]), np.nan, dtype=np.float32))
+            all_vectors[ambiguous] = ambiguous_vectors
+
+    if stats is not None:
+        total = len(standard_topics)
+        counts = {tier: tiers.count(tier) for tier in ("exact", "token_overlap", "embedding")}
+        stats.update({
+            "standard_topics": total,
+            "curriculum_topics": len(curriculum_topics),
+            "resolved": counts,
+            "resolved_fraction": {tier: round(n / total, 3) if total else 0.0 for tier, n in counts.items()},
+            "embedded_texts": embedded_standards + len(curriculum_topics) if ambiguous else 0,
+            "tiers": tiers,
+        })
+        if all_vectors is not None:
+            stats["standard_vectors"] = all_vectors
+            stats["embedding_backend"] = backend.name
+
+    return scores
+
+
+def classify_scores(scores, standard_topics, curriculum_topics, full_threshold=None, partial_threshold=None,
+                    tiers=None, default_thresholds=(None, None)):
+    """Derive mapping rows from a (standards x curriculum) score matrix.
+
+    Rows that `tiers` marks as resolved lexically hold token-overlap rather than
+    cosine scores, so custom thresholds do not apply to them; they keep the
+    default (full, partial) ones, `default_thresholds` or the configured ones.
+    """
     results = []
 
-    for std_topic in standard_data["topics"]:
-        std_vec = embed(std_topic)
+    if curriculum_topics:
+        best_columns = np.asarray(scores).argmax(axis=1)
 
+    for i, std_topic in enumerate(standard_topics):
         best_match = None
         best_score = -1
 
-        for cur_topic in curriculum_data["topics"]:
-            curr_vec = embed(cur_topic)
-            score = cosine_similarity([std_vec], [curr_vec])[0][0]
-
-            if score > best_score:
-                best_score = score
-                best_match = cur_topic
-
-        status = ("Fully aligned" if best_score >= 0.80
-                  else "Partial match" if best_score >= 0.60
-                  else "Missing")
+        if curriculum_topics:
+            j = int(best_columns[i])
+            best_match = curriculum_topics[j]
+            best_score = scores[i][j]
 
         results.append({
             "standard_topic": std_topic,
             "closest_curriculum_topic": best_match,
             "similarity": round(float(best_score), 2),
-            "status": status
+            "status": alignment_status(best_score, *default_thresholds) if tiers and tiers[i] != "embedding"
+            else alignment_status(best_score, full_threshold, partial_threshold)
         })
 
     return results
+
+
+def similarity_scores(curriculum_data, standard_data, backend=None, stats=None, standard_vectors=None, check=None,
+                      lexical_threshold=None):
+    """Score matrix for the topics of two structured documents (empty-safe)."""
+    standard_topics = standard_data["topics"]
+    curriculum_topics = curriculum_data["topics"]
+
+    if standard_topics and curriculum_topics:
+        return score_matrix(standard_topics, curriculum_topics, backend, stats, standard_vectors, check,
+                            lexical_threshold)
+    return np.zeros((len(standard_topics), len(curriculum_topics)), dtype=np.float32)
+
+
+def compute_similarity(curriculum_data, standard_data, backend=None, stats=None):
+
+    scores = similarity_scores(curriculum_data, standard_data, backend, stats)
+    return classify_scores(scores, standard_data["topics"], curriculum_data["topics"])
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+import numpy as np
+from .config import STANDARDS_FOLDER
+from .similarity_engine import get_embedding_backend, LocalEmbeddingBackend
+from .topic_dedup import dedup_structure
+
+# Each registered standards document lives in STANDARDS_FOLDER/<standards_id>/:
+#   meta.json                 id, name, status, source file, timestamps
+#   structure.json            output of structure_content
+#   embeddings_<backend>.npy  embeddings of the deduplicated topics, row for row
+#                             (corpus-independent backends only; the local backend
+#                             is fit per analysis on standards and curriculum together)
+
+STANDARDS_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def standards_dir(standards_id, root=STANDARDS_FOLDER):
+    if not STANDARDS_ID_PATTERN.match(standards_id or ""):
+        raise ValueError(f"Invalid standards_id: {standards_id!r}")
+    return os.path.join(root, standards_id)
+
+
+def new_standards_id():
+    return f"std_{uuid.uuid4().hex[:8]}"
+
+
+def _write_meta(standards_id, meta, root=STANDARDS_FOLDER):
+    path = os.path.join(standards_dir(standards_id, root), "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def get_meta(standards_id, root=STANDARDS_FOLDER):
+    path = os.path.join(standards_dir(standards_id, root), "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_standards(root=STANDARDS_FOLDER):
+    if not os.path.isdir(root):
+        return []
+    entries = []
+    for name in sorted(os.listdir(root)):
+        if STANDARDS_ID_PATTERN.match(name):
+            meta = get_meta(name, root)
+            if meta:
+                entries.append(meta)
+    return entries
+
+
+def is_ready(standards_id, root=STANDARDS_FOLDER):
+    try:
+        meta = get_meta(standards_id, root)
+    except ValueError:
+        return False
+    return bool(meta) and meta.get("status") == "ready"
+
+
+def create_entry(name, source_filename, standards_id=None, root=STANDARDS_FOLDER):
+    """Reserve a registry entry before the (slow) ingestion starts."""
+    standards_id = standards_id or new_standards_id()
+    os.makedirs(standards_dir(standards_id, root), exist_ok=True)
+    _write_meta(standards_id, {
+        "id": standards_id,
+        "name": name or source_filename,
+        "source": source_filename,
+        "status": "processing",
+        "created": datetime.now().isoformat(),
+    }, root)
+    return standards_id
+
+
+def ingest_standards(standards_id, text, structure_fn, backend=None, root=STANDARDS_FOLDER):
+    """Structure a standards document once and store its topic embeddings.
+
+    `structure_fn(text, output_path)` must write the structured JSON to
+    `output_path` and return the parsed structure.
+    """
+    directory = standards_dir(standards_id, root)
+    meta = get_meta(standards_id, root)
+    try:
+        structured = structure_fn(text, os.path.join(directory, "structure.json"))
+
+        topics = dedup_structure(structured)[0]["topics"]
+        backend = backend or get_embedding_backend()
+        backends = set(meta.get("embedding_backends", []))
+        if backend.corpus_independent:
+            vectors = backend.embed_many(topics) if topics else np.zeros((0, 0), dtype=np.float32)
+            np.save(os.path.join(directory, f"embeddings_{backend.name}.npy"), vectors)
+            backends.add(backend.name)
+
+        meta.update({
+            "status": "ready",
+            "subject": structured.get("subject", ""),
+            "topics": len(topics),
+            "embedding_backends": sorted(backends),
+            "completed": datetime.now().isoformat(),
+        })
+    except Exception as e:
+        meta.update({"status": "failed", "error": str(e)})
+        raise
+    finally:
+        _write_meta(standards_id, meta, root)
+    return meta
+
+
+def load_structure(standards_id, root=STANDARDS_FOLDER):
+    with open(os.path.join(standards_dir(standards_id, root), "structure.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_embeddings(standards_id, backend_name=None, root=STANDARDS_FOLDER):
+    """Return (backend, topic embeddings) for the configured backend, or (None, None)
+    when none are stored for it (the document was registered with another backend).
+
+    The local backend has to be fit on each analysis's own corpus, so it comes
+    without embeddings but caches its fits with the registered document."""
+    backend = get_embedding_backend(backend_name)
+    if isinstance(backend, LocalEmbeddingBackend):
+        backend.fit_cache_dir = os.path.join(standards_dir(standards_id, root), "local_fits")
+        return backend, None
+    vectors_path = os.path.join(standards_dir(standards_id, root), f"embeddings_{backend.name}.npy")
+    if not backend.corpus_independent or not os.path.exists(vectors_path):
+        return None, None
+    return backend, np.load(vectors_path)
@@ -1,12 +1,21 @@
 import json
 import re
 import google.generativeai as genai
-from .config import GEMINI_API_KEY
-
-genai.configure(api_key=GEMINI_API_KEY)
+from typing_extensions import TypedDict
+from .config import GEMINI_REQUEST_TIMEOUT_S
 
 MODEL_NAME = "gemini-2.5-flash"
 
+LIST_FIELDS = ("topics", "subtopics", "competencies", "learning_outcomes")
+
+
+class CurriculumStructure(TypedDict):
+    subject: str
+    topics: list[str]
+    subtopics: list[str]
+    competencies: list[str]
+    learning_outcomes: list[str]
+
 
 def extract_json(clean_text: str):
     """Extracts the first JSON block inside a response."""
@@ -17,38 +26,183 @@ def extract_json(clean_text: str):
         raise ValueError("❌ Model did not return valid JSON.")
 
 
-def structure_content(text: str, output_path: str):
-    prompt = f"""
+def _decode_string(raw):
+    """Value of a JSON string body; raw control characters are tolerated and a
+    body with invalid escapes is kept as written rather than failing the parse."""
+    try:
+        return json.loads('"' + raw + '"', strict=False)
+    except ValueError:
+        return raw
+
+
+class StructureStreamParser:
+    """Incremental scanner over a streamed structuring response.
+
+    Fed raw text chunks, it reports each string of a top-level list field as
+    soon as its closing quote arrives, remembers which fields were closed
+    completely, and can repair a truncated document by closing whatever is
+    still open.
+    """
+
+    def __init__(self, on_item=None):
+        self.on_item = on_item
+        self.buffer = []
+        self.items = {field: [] for field in LIST_FIELDS}
+        self.complete = set()
+        self.subject = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._key = None
+        self._expect_value = False
+
+    def feed(self, chunk):
+        for ch in chunk:
+            if not self.buffer and ch != "{":
+                continue  # skip fences or prose before the object
+            self.buffer.append(ch)
+            self._scan(ch)
+
+    def _scan(self, ch):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                self._close_string(_decode_string("".join(self._string)))
+                return
+            self._string.append(ch)
+            return
+
+        top_level = len(self._stack) == 1
+        if ch == '"':
+            self._in_string = True
+            self._string = []
+        elif ch in "{[":
+            self._stack.append(ch)
+            self._expect_value = False
+        elif ch in "}]":
+            if self._stack:
+                self._stack.pop()
+            if ch == "]" and len(self._stack) == 1 and self._key in self.items:
+                self.complete.add(self._key)
+        elif top_level and ch == ":":
+            self._expect_value = True
+        elif top_level and ch == ",":
+            self._expect_value = False
+
+    def _close_string(self, value):
+        depth = len(self._stack)
+        if depth == 1 and self._expect_value:
+            if self._key == "subject":
+                self.subject = value
+                self.complete.add("subject")
+            self._expect_value = False
+        elif depth == 1:
+            self._key = value
+        elif depth == 2 and self._stack[-1] == "[" and self._key in self.items:
+            self.items[self._key].append(value)
+            if self.on_item:
+                self.on_item(self._key, value)
+
+    def text(self):
+        return "".join(self.buffer)
+
+    def repaired(self):
+        """Best-effort completion of a truncated document."""
+        text = self.text()
+        if self._in_string:
+            text += '"'
+        text = re.sub(r"[,:\s]+$", "", text)
+        for opener in reversed(self._stack):
+            text += "]" if opener == "[" else "}"
+        return text
+
+
+def _prompt(text, fields):
+    schema = {"subject": ""} if "subject" in fields else {}
+    schema.update({field: [] for field in fields if field != "subject"})
+    return f"""
     You are an AI curriculum parser.
 
     Return ONLY valid JSON.
     No explanations, no markdown, no extra text.
 
     JSON Format:
-    {{
-      "subject": "",
-      "topics": [],
-      "subtopics": [],
-      "competencies": [],
-      "learning_outcomes": []
-    }}
+    {json.dumps(schema, indent=2)}
 
     Extract based on the following content:
 
     {text}
     """
 
-    model = genai.GenerativeModel(MODEL_NAME)
-    response = model.generate_content(prompt)
-
-    raw = response.text.strip()
 
-    # Clean markdown fences if present
+def _parse(raw):
     raw = raw.replace("```json", "").replace("```", "").strip()
+    return json.loads(extract_json(raw))
 
-    extracted_json = extract_json(raw)
 
-    with open(output_path, "w") as f:
-        f.write(extracted_json)
+def structure_content(text: str, output_path: str = None, on_item=None, check=None):
+    """Structure a document into subject/topics/subtopics/competencies/learning_outcomes.
 
-    return extracted_json
+    The model is asked for schema-constrained JSON and the response is parsed
+    while it streams: `on_item(field, value)` is called for every list entry as
+    soon as it is complete. A reply that is cut off or malformed is repaired
+    where possible, and only the fields that could not be recovered are
+    requested again. `check()` is called between streamed chunks and may raise
+    to abort. Returns the parsed dict (and writes it to `output_path`).
+    """
+    model = genai.GenerativeModel(MODEL_NAME)
+    config = genai.GenerationConfig(response_mime_type="application/json", response_schema=CurriculumStructure)
+
+    request_options = {"timeout": GEMINI_REQUEST_TIMEOUT_S}
+
+    parser = StructureStreamParser(on_item)
+    stream = model.generate_content(_prompt(text, ("subject",) + LIST_FIELDS), generation_config=config,
+                                    stream=True, request_options=request_options)
+    for chunk in stream:
+        if check:
+            check()
+        parser.feed(chunk.text)
+
+    try:
+        structured = json.loads(parser.text(), strict=False)
+    except ValueError:
+        try:
+            structured = json.loads(parser.repaired(), strict=False)
+            # Only fields that closed before the cut-off are trusted; the rest are re-requested
+            structured = {k: v for k, v in structured.items() if k in parser.complete}
+        except ValueError:
+            structured = {"subject": parser.subject} if parser.subject is not None else {}
+            structured.update({field: parser.items[field] for field in parser.complete if field in parser.items})
+
+    missing = [field for field in ("subject",) + LIST_FIELDS if field not in structured]
+    if missing:
+        print(f"⚠️ Structuring response incomplete, re-requesting: {', '.join(missing)}")
+        if check:
+            check()
+        retry = model.generate_content(_prompt(text, missing),
+                                       generation_config=genai.GenerationConfig(response_mime_type="application/json"),
+                                       request_options=request_options)
+        try:
+            recovered = _parse(retry.text)
+        except ValueError as e:
+            print(f"⚠️ Re-requested fields unusable ({e}); keeping what streamed")
+            recovered = {}
+        for field in missing:
+            if field in recovered:
+                structured[field] = recovered[field]
+            elif field in parser.items:
+                # Keep whatever streamed before the failure rather than nothing
+                structured[field] = parser.items[field]
+            else:
+                structured[field] = ""
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(structured, f, ensure_ascii=False)
+
+    return structured
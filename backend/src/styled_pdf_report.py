@@ -139,7 +139,8 @@ def create_report(json_file, output="results/final_report.pdf"):
     elements.append(Spacer(1, 20))
 
     # -------- Alignment Chart --------
-    chart = generate_alignment_chart(mapping_data)
+    # Next to the PDF, so concurrent reports in different folders do not share one chart file
+    chart = generate_alignment_chart(mapping_data, os.path.join(os.path.dirname(output) or ".", "alignment_chart.png"))
     elements.append(Image(chart, width=5.5 * inch, height=3 * inch))
     elements.append(Spacer(1, 30))
 
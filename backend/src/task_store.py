@@ -0,0 +1,118 @@
+import json
+import os
+import time
+from .artifact_store import HOST, SESSION_ID_PATTERN, pid_alive, shard_name
+
+# One JSON file per session, so every worker process sees the same status;
+# files are sharded like the session artifacts
+
+
+class TaskStore:
+    """File-backed status of background analyses, shared by all worker processes."""
+
+    def __init__(self, root, stale_after_seconds=120):
+        self.root = root
+        self.stale_after_seconds = stale_after_seconds
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, session_id):
+        if not SESSION_ID_PATTERN.match(session_id or ""):
+            raise ValueError(f"Invalid session_id: {session_id!r}")
+        return os.path.join(self.root, shard_name(session_id), f"{session_id}.json")
+
+    def get(self, session_id):
+        try:
+            path = self.path(session_id)
+            if not os.path.exists(path):
+                # Written before status files were sharded
+                path = os.path.join(self.root, os.path.basename(path))
+            with open(path, "r", encoding="utf-8") as f:
+                status = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if self.is_stale(session_id, status):
+            owner = status.get("owner") or {}
+            return {
+                "status": "failed",
+                "progress": status.get("progress", 0),
+                "message": "Analysis was interrupted: the worker running it "
+                           f"({owner.get('host')}, pid {owner.get('pid')}) stopped",
+            }
+        return status
+
+    def set(self, session_id, status):
+        """Store `status`; a processing status records this process as its owner and beats once."""
+        path = self.path(session_id)
+        if status.get("status") == "processing":
+            status = dict(status, owner={"host": HOST, "pid": os.getpid()})
+            self.heartbeat(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp name so concurrent writers never share a partial file
+        tmp_path = f"{path}.{os.getpid()}.{id(status)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return status
+
+    def update(self, session_id, **fields):
+        """Merge `fields` into the stored status (only the owning task writes, so no lock is needed)."""
+        status = self.get(session_id) or {}
+        status.update(fields)
+        return self.set(session_id, status)
+
+    def is_processing(self, session_id):
+        status = self.get(session_id)
+        return bool(status) and status.get("status") == "processing"
+
+    # The owning task touches a heartbeat file while it runs; a processing
+    # status whose owner died (crash, OOM, restart) would otherwise stay
+    # processing forever, so it reads as failed once the beat stops
+    def heartbeat_path(self, session_id):
+        return self.path(session_id)[:-len(".json")] + ".heartbeat"
+
+    def heartbeat(self, session_id):
+        path = self.heartbeat_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8"):
+            pass
+        os.utime(path)
+
+    def is_stale(self, session_id, status):
+        """True for a processing status whose owner is gone or has not beaten recently"""
+        if status.get("status") != "processing" or "owner" not in status:
+            return False  # finished, or written before owners were recorded
+        owner = status["owner"]
+        if owner.get("host") == HOST and not pid_alive(owner.get("pid")):
+            return True
+        try:
+            last_beat = os.path.getmtime(self.heartbeat_path(session_id))
+        except FileNotFoundError:
+            return True
+        return time.time() - last_beat > self.stale_after_seconds
+
+    # Cancellation requests are separate marker files, so a request from any
+    # worker never races with the status updates of the running task
+    def cancel_path(self, session_id):
+        return self.path(session_id)[:-len(".json")] + ".cancel"
+
+    def request_cancel(self, session_id):
+        os.makedirs(os.path.dirname(self.cancel_path(session_id)), exist_ok=True)
+        with open(self.cancel_path(session_id), "w", encoding="utf-8"):
+            pass
+
+    def cancel_requested(self, session_id):
+        return os.path.exists(self.cancel_path(session_id))
+
+    def clear_cancel(self, session_id):
+        try:
+            os.remove(self.cancel_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, session_id):
+        for path in (self.path(session_id), self.cancel_path(session_id), self.heartbeat_path(session_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,82 @@
+from .similarity_engine import normalize_topic
+
+# Words that only qualify a topic title ("Classification models",
+# "Classification techniques") and are ignored when comparing titles
+GENERIC_TERMS = {
+    "a", "an", "and", "the", "of", "to", "in", "on", "for", "with",
+    "introduction", "overview", "basics", "fundamentals", "principles",
+    "concept", "technique", "method", "model", "approach",
+}
+
+STRUCTURE_FIELDS = ("topics", "subtopics", "competencies", "learning_outcomes")
+
+
+def _stem(token):
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def topic_signature(topic):
+    """Order-insensitive signature of the meaningful, crudely stemmed words of a title."""
+    tokens = {_stem(t) for t in normalize_topic(topic).split()}
+    meaningful = tokens - GENERIC_TERMS
+    return " ".join(sorted(meaningful or tokens))
+
+
+def collapse_topics(topics):
+    """Collapse near-duplicate topics that share a signature.
+
+    Returns (canonical_topics, groups): canonical topics keep first-seen order
+    and spelling, and `groups` maps each canonical topic to every original string
+    that collapsed into it.
+    """
+    canonical_by_signature = {}
+    groups = {}
+
+    for topic in topics:
+        if not isinstance(topic, str) or not topic.strip():
+            continue
+        signature = topic_signature(topic)
+        canonical = canonical_by_signature.setdefault(signature, topic)
+        variants = groups.setdefault(canonical, [])
+        if topic not in variants:
+            variants.append(topic)
+
+    return list(groups), groups
+
+
+def dedup_structure(structured):
+    """Copy of a structured document with near-duplicate entries collapsed in every list field."""
+    deduped = dict(structured)
+    groups = {}
+    for field in STRUCTURE_FIELDS:
+        deduped[field], groups[field] = collapse_topics(structured.get(field) or [])
+    return deduped, groups
+
+
+def redundancy_warnings(groups, source):
+    """Groups that actually merged several distinct strings, for the report's redundancy section."""
+    warnings = []
+    for field, field_groups in groups.items():
+        for canonical, variants in field_groups.items():
+            if len(variants) > 1:
+                warnings.append({
+                    "source": source,
+                    "field": field,
+                    "topic": canonical,
+                    "variants": variants,
+                })
+    return warnings
+
+
+def annotate_mapping(mapping, standard_groups, curriculum_groups):
+    """Attach the original strings behind each canonical topic of a mapping row."""
+    for row in mapping:
+        standard_variants = standard_groups.get(row["standard_topic"], [])
+        if len(standard_variants) > 1:
+            row["standard_variants"] = standard_variants
+        curriculum_variants = curriculum_groups.get(row["closest_curriculum_topic"], [])
+        if len(curriculum_variants) > 1:
+            row["curriculum_variants"] = curriculum_variants
+    return mapping